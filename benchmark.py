@@ -0,0 +1,332 @@
+"""Headless benchmarks with fixed seeds, optionally compared to a baseline.
+
+    python benchmark.py --save-baseline baseline.json
+    python benchmark.py --baseline baseline.json
+
+Comparing exits with status 1 when a median got slower than the threshold.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+from time import perf_counter
+
+import engine.headless as headless
+
+headless.enable()
+
+import pymunk  # noqa: E402
+
+import game  # noqa: E402
+from engine.hs_handling import ScoreStore, ScoreWriter  # noqa: E402
+from engine.level import LevelCache  # noqa: E402
+from engine.obstacles import Obstacles  # noqa: E402
+from engine.player import MotorBike, Tank  # noqa: E402
+from engine.scrolling_text import ScrollingText  # noqa: E402
+from engine.sound_loop import VoicePool  # noqa: E402
+from engine.terrain import Terrain  # noqa: E402
+
+SEED = 1234
+COURSE_LENGTHS = (10000, 30000, 100000, 300000)
+HIGHSCORE_ROWS = (10, 1000, 100000)
+SCROLL_SPEED = 15  # camera pixels per frame in the terrain/obstacle sweeps
+BENCHMARKS = []
+
+
+def benchmark(function):
+    BENCHMARKS.append(function)
+    return function
+
+
+class BenchWindow(object):
+    # the parts of the window that vehicles, terrain and obstacles use
+    width = 1280
+    height = 720
+    engine_voices = VoicePool("engine_sfx")
+
+
+def timed(function, repeat, setup=None):
+    # milliseconds per call, setup is run before each call and not timed
+    samples = []
+    for run in range(repeat):
+        if setup:
+            setup()
+        start = perf_counter()
+        function()
+        samples.append((perf_counter() - start) * 1000)
+    return samples
+
+
+def game_modes():
+    return (
+        (game.Menu, dict(seed=SEED)),
+        (game.Game1, dict(level_id=SEED)),
+        (game.Game2, dict(level_id=SEED)),
+        (game.Game3, dict(level_id=SEED)),
+        (game.HighScore, dict(game=game.Game1.name, seed=SEED)),
+        (game.Endgame, dict(game=game.Game1.name, score=100.0, seed=SEED)),
+    )
+
+
+@benchmark
+def construct(repeat):
+    # level data is cached after the first run, the median is a warm start
+    for mode, kwargs in game_modes():
+        samples = timed(lambda: game.HeadlessWindow(mode=mode.id, **kwargs), repeat)
+        yield "construct." + mode.__name__, samples
+
+
+@benchmark
+def level(repeat):
+    cache = game.level_cache
+    game.level_cache = LevelCache(directory=None)
+    try:
+        for mode in (game.Game1, game.Game2):
+            samples = timed(lambda: mode.generate_level(SEED), repeat)
+            yield "level.generate." + mode.__name__, samples
+    finally:
+        game.level_cache = cache
+
+
+@benchmark
+def transition(repeat):
+    for mode in (game.Game1, game.Game2):
+        window = game.HeadlessWindow(mode=mode.id, level_id=SEED)
+        samples = timed(lambda: window.switch_mode(mode.id, level_id=SEED), repeat)
+        yield "transition.restart." + mode.__name__, samples
+
+        samples = timed(
+            lambda: window.switch_mode(mode.id, level_id=SEED),
+            repeat,
+            setup=lambda: window.switch_mode(game.Menu.id, seed=SEED),
+        )
+        yield "transition.menu_to." + mode.__name__, samples
+
+
+def vehicle_space(vehicle_class, **kwargs):
+    space = pymunk.Space()
+    space.gravity = 0, -900
+    ground = pymunk.Segment(space.static_body, (-1000, 100), (10 ** 6, 100), 5)
+    ground.filter = pymunk.ShapeFilter(categories=0b0001000, mask=0b1110111)
+    ground.friction = 0.85
+    space.add(ground)
+    vehicle = vehicle_class(
+        headless.NullBatch(), space, BenchWindow(), (400, 300), **kwargs
+    )
+    vehicle.forward()
+    for frame in range(60):  # settle on the ground
+        space.step(1 / 60.0)
+    return space
+
+
+@benchmark
+def step(repeat):
+    for name, vehicle_class, kwargs in (
+        ("tank", Tank, dict(add_boxlives=True)),
+        ("motorbike", MotorBike, dict()),
+    ):
+        space = vehicle_space(vehicle_class, **kwargs)
+        samples = timed(lambda: space.step(1 / 60.0), repeat * 30)
+        yield "step." + name, samples
+
+
+def sweep(update, start, repeat):
+    # per-frame cost of update while the camera scrolls through the course
+    offsets = iter(range(start, start + repeat * 30 * SCROLL_SPEED, SCROLL_SPEED))
+    return timed(lambda: update(next(offsets)), repeat * 30)
+
+
+@benchmark
+def terrain(repeat):
+    for length in COURSE_LENGTHS:
+
+        def build():
+            return Terrain(
+                headless.NullBatch(),
+                pymunk.Space(),
+                BenchWindow(),
+                interval=50,
+                mid_height=170,
+                height_change=0.5,
+                end_coordinate=length,
+                seed=SEED,
+            )
+
+        yield "terrain.construct.{}".format(length), timed(build, repeat)
+        yield "terrain.update.{}".format(length), sweep(
+            build().update, length // 2, repeat
+        )
+
+
+@benchmark
+def obstacles(repeat):
+    for length in COURSE_LENGTHS:
+
+        def build():
+            return Obstacles(
+                headless.NullBatch(),
+                pymunk.Space(),
+                BenchWindow(),
+                end_coordinate=length,
+                amount=3,
+                seed=SEED,
+            )
+
+        yield "obstacles.construct.{}".format(length), timed(build, repeat)
+        yield "obstacles.update.{}".format(length), sweep(
+            build().update, length // 2, repeat
+        )
+
+
+@benchmark
+def highscore(repeat):
+    for rows in HIGHSCORE_ROWS:
+        store = ScoreStore("bench_{}.db".format(rows))
+        with store.connection:
+            store.connection.executemany(
+                "INSERT INTO scores (game, name, score) VALUES (?, ?, ?)",
+                (("bench", "player{}".format(row), row * 1.5) for row in range(rows)),
+            )
+        samples = timed(lambda: store.add("bench", "bench", rows * 0.75), repeat)
+        yield "highscore.add.{}".format(rows), samples
+        samples = timed(lambda: store.top("bench", ascending=False), repeat)
+        yield "highscore.top.{}".format(rows), samples
+        # what entering a name costs the frame, the insert is written behind
+        writer = ScoreWriter(store)
+        writer.top("bench", ascending=False)
+        samples = timed(lambda: writer.submit("bench", "bench", rows * 0.75), repeat)
+        yield "highscore.submit.{}".format(rows), samples
+        writer.close()
+
+
+@benchmark
+def scrolling(repeat):
+    # the leaderboard column of the highscore screens
+    for rows in HIGHSCORE_ROWS:
+        text = "".join("{:>5.1f}\n".format(row * 1.5) for row in range(rows))
+
+        def build():
+            return ScrollingText(
+                headless.NullBatch(), (325, 30), 80, 300, text, align="right"
+            )
+
+        yield "scrolling.construct.{}".format(rows), timed(build, repeat)
+        column = build()
+        column.timeout = 0  # scrolls from the first update
+        yield "scrolling.update.{}".format(rows), timed(column.update, repeat * 30)
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    return dict(
+        median_ms=statistics.median(ordered),
+        mean_ms=statistics.mean(ordered),
+        p95_ms=ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        min_ms=ordered[0],
+        samples=len(ordered),
+    )
+
+
+def run(groups, repeat):
+    results = dict()
+    for function in BENCHMARKS:
+        if groups and function.__name__ not in groups:
+            continue
+        measurements = function(repeat)
+        while True:
+            # mode switches print as they go
+            with contextlib.redirect_stdout(io.StringIO()):
+                measurement = next(measurements, None)
+            if measurement is None:
+                break
+            name, samples = measurement
+            results[name] = summarize(samples)
+            print("{:<36}{:>10.3f} ms".format(name, results[name]["median_ms"]))
+    return results
+
+
+def compare(results, baseline, threshold, noise_ms=0.01):
+    # returns the names whose median got slower than threshold allows
+    regressions = []
+    print()
+    header = ("benchmark", "median ms", "baseline", "change")
+    print("{:<36}{:>12}{:>12}{:>9}".format(*header))
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        old, new = baseline[name]["median_ms"], result["median_ms"]
+        change = (new - old) / old if old else 0.0
+        slower = change > threshold and new - old > noise_ms
+        if slower:
+            regressions.append(name)
+        print(
+            "{:<36}{:>12.3f}{:>12.3f}{:>+8.0%}{}".format(
+                name, new, old, change, "  SLOWER" if slower else ""
+            )
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--only",
+        nargs="+",
+        choices=[function.__name__ for function in BENCHMARKS],
+        help="benchmark groups to run, all by default",
+    )
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--output", help="write the results as json")
+    parser.add_argument("--baseline", help="compare against a saved result file")
+    parser.add_argument("--save-baseline", help="write the results as a new baseline")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.15,
+        help="relative slowdown of a median counted as a regression",
+    )
+    args = parser.parse_args()
+    paths = [args.output, args.baseline, args.save_baseline]
+    output, baseline, save_baseline = [path and os.path.abspath(path) for path in paths]
+
+    # level cache and highscore databases go to a scratch directory
+    workdir = tempfile.mkdtemp(prefix="hillclimb_benchmark_")
+    os.chdir(workdir)
+    try:
+        results = run(args.only, args.repeat)
+    finally:
+        os.chdir(os.path.dirname(os.path.abspath(__file__)))
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = dict(
+        meta=dict(
+            python=platform.python_version(),
+            platform=platform.platform(),
+            pymunk=pymunk.version,
+            seed=SEED,
+            repeat=args.repeat,
+        ),
+        results=results,
+    )
+    for path in (output, save_baseline):
+        if path:
+            with open(path, "w") as report_file:
+                json.dump(report, report_file, indent=1)
+    if baseline:
+        with open(baseline) as baseline_file:
+            regressions = compare(
+                results, json.load(baseline_file)["results"], args.threshold
+            )
+        if regressions:
+            print("\n{} benchmark(s) slower than baseline".format(len(regressions)))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
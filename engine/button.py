@@ -3,6 +3,8 @@ from math import degrees
 import pymunk
 import pyglet
 
+from .physical_object import lerp_transform
+
 
 class Button(pymunk.Body):
     def __init__(self, batch, space, id, position, img, dimensions, 
@@ -28,20 +30,27 @@ class Button(pymunk.Body):
         self.button_shape.id = id
         self.sprite = pyglet.sprite.Sprite(img, x=self.position.x, y=self.position.y,
             batch=batch, group=group)
+        self.previous = None
+        self.current = None
         space.add(*self.get_physical_object())
 
     def update(self, x_offset=0):
+        transform = (self.position.x - x_offset, self.position.y,
+                     -degrees(self.angle))
+        self.previous = self.current or transform
+        self.current = transform
+        self.__apply(transform)
+
+    def interpolate(self, alpha):
+        if self.current:
+            self.__apply(lerp_transform(self.previous, self.current, alpha))
+
+    def __apply(self, transform):
+        x, y, rotation = transform
         if self.update_rotate:
-            self.sprite.update(
-                x=self.position.x - x_offset,
-                y=self.position.y,
-                rotation=-degrees(self.angle)
-            )
+            self.sprite.update(x=x, y=y, rotation=rotation)
         else:
-            self.sprite.update(
-                x=self.position.x - x_offset,
-                y=self.position.y
-            )
+            self.sprite.update(x=x, y=y)
 
     def get_physical_object(self):
         return self, self.button_shape
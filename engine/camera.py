@@ -0,0 +1,50 @@
+import pyglet
+from pyglet.gl import glPushMatrix, glPopMatrix, glTranslatef
+
+
+class Camera(object):
+    # x and y are where the view is drawn from. update sets them once per
+    # game tick, interpolate moves them between the last two ticks
+    def __init__(self, x=0, y=0):
+        self.reset(x, y)
+
+    def reset(self, x=0, y=0):
+        self.x = x
+        self.y = y
+        self.previous = None
+        self.current = None
+
+    def update(self, x=0, y=0):
+        self.previous = self.current or (x, y)
+        self.current = (x, y)
+        self.x, self.y = x, y
+
+    def interpolate(self, alpha):
+        if self.current:
+            (x0, y0), (x1, y1) = self.previous, self.current
+            self.x = x0 + (x1-x0)*alpha
+            self.y = y0 + (y1-y0)*alpha
+
+
+class CameraGroup(pyglet.graphics.OrderedGroup):
+    # draws its children in world coordinates, translated by the camera once
+    # per frame instead of moving every vertex on the cpu
+    def __init__(self, order, camera, parent=None):
+        super().__init__(order, parent)
+        self.camera = camera
+
+    def set_state(self):
+        glPushMatrix()
+        glTranslatef(-self.camera.x, -self.camera.y, 0)
+
+    def unset_state(self):
+        glPopMatrix()
+
+    def __eq__(self, other):
+        return (self.__class__ is other.__class__ and
+                self.order == other.order and
+                self.parent == other.parent and
+                self.camera is other.camera)
+
+    def __hash__(self):
+        return hash((self.order, self.parent, id(self.camera)))
@@ -41,8 +41,12 @@ class MeterSprite(object):
         self.motor_sprite.update(rotation=-25+230*percent)
 
 class ParallaxBG(object):
-    def __init__(self, batch, size, bg_index=0):
+    # with a camera it follows the camera's interpolated x once per drawn
+    # frame, like the world it is drawn behind. without one it is moved by
+    # calling update
+    def __init__(self, batch, size, bg_index=0, camera=None):
         self.window_width, self.window_height = size
+        self.camera = camera
         self.background_layers = list()
         self.past_offset = 0
         self.new_offset = 0
@@ -71,6 +75,16 @@ class ParallaxBG(object):
                 sprite_set.reverse()
         self.past_offset = offset
 
+    def interpolate(self, alpha):
+        self.update(self.camera.x)
+
+    def reset(self):
+        for sprite_set in self.background_layers:
+            sprite_set[0].update(x=0)
+            sprite_set[1].update(x=sprite_set[0].width)
+        self.past_offset = 0
+        self.new_offset = 0
+
 class BallIndicator(object):
     def __init__(self, batch, window, group=None):
         self.height = window.height
@@ -0,0 +1,275 @@
+import struct
+import sys
+
+import numpy
+import pyglet
+
+# Null renderer used to run the game modes without a window or GL context.
+# enable() swaps pyglet's GL/audio backed constructors for the classes below,
+# so Terrain, Obstacles, Vehicle and the game modes run their usual code paths
+# while drawing nothing. It has to be called before engine.resources (or game)
+# is imported.
+
+enabled = False
+
+
+def vertex_attribute_name(fmt):
+    names = {'v': 'vertices', 'c': 'colors', 't': 'tex_coords',
+             'n': 'normals', 'e': 'edge_flags', 'f': 'fog_coords',
+             's': 'secondary_colors'}
+    size = int(''.join(char for char in fmt[1:] if char.isdigit()) or 1)
+    return names.get(fmt[0], fmt), size
+
+
+class NullVertexList(object):
+    def __init__(self, count, indices, data):
+        self.count = count
+        self.indices = list(indices)
+        for item in data:
+            fmt, initial = (item, None) if isinstance(item, str) else item
+            name, size = vertex_attribute_name(fmt)
+            values = numpy.zeros(count*size)
+            if initial is not None:
+                values[:] = initial
+            setattr(self, name, values)
+
+    def resize(self, count, index_count=None):
+        self.count = count
+
+    def migrate(self, domain):
+        pass
+
+    def delete(self):
+        pass
+
+
+class NullBatch(object):
+    def add(self, count, mode, group, *data):
+        return NullVertexList(count, (), data)
+
+    def add_indexed(self, count, mode, group, indices, *data):
+        return NullVertexList(count, indices, data)
+
+    def migrate(self, vertex_list, mode, group, batch):
+        pass
+
+    def invalidate(self):
+        pass
+
+    def draw(self):
+        pass
+
+
+class NullImage(object):
+    def __init__(self, width=1, height=1):
+        self.width = width
+        self.height = height
+        self.anchor_x = 0
+        self.anchor_y = 0
+
+    def get_texture(self, rectangle=False, force_rectangle=False):
+        return self
+
+    def get_region(self, x, y, width, height):
+        return NullImage(width, height)
+
+
+class NullTexture(NullImage):
+    id = 0
+    target = 0x0DE1 # GL_TEXTURE_2D
+
+
+class NullGlyph(object):
+    def __init__(self, advance, ascent, descent, owner):
+        self.advance = advance
+        self.vertices = (0, descent, advance, ascent)
+        self.tex_coords = (0,)*12
+        self.owner = owner
+
+
+class NullFont(object):
+    # fixed width metrics so text layouts can run without rasterizing glyphs
+    texture = NullTexture()
+
+    def __init__(self, name=None, size=12, dpi=96):
+        pixels = (size or 12)*(dpi or 96)/72
+        self.name = name
+        self.size = size
+        self.ascent = round(pixels*0.8)
+        self.descent = -round(pixels*0.2)
+        self.glyph = NullGlyph(round(pixels*0.6), self.ascent, self.descent,
+                               self.texture)
+
+    def get_glyphs(self, text):
+        return [self.glyph]*len(text)
+
+
+class NullSprite(object):
+    def __init__(self, img, x=0, y=0, blend_src=None, blend_dest=None,
+                 batch=None, group=None, usage='dynamic', subpixel=False):
+        self.image = img
+        self.x = x
+        self.y = y
+        self.batch = batch
+        self.group = group
+        self.rotation = 0
+        self.scale = 1
+        self.scale_x = 1
+        self.scale_y = 1
+        self.opacity = 255
+        self.color = (255, 255, 255)
+        self.visible = True
+
+    @property
+    def position(self):
+        return self.x, self.y
+
+    @position.setter
+    def position(self, position):
+        self.x, self.y = position
+
+    @property
+    def width(self):
+        return self.image.width*abs(self.scale_x*self.scale)
+
+    @property
+    def height(self):
+        return self.image.height*abs(self.scale_y*self.scale)
+
+    def update(self, x=None, y=None, rotation=None, scale=None,
+               scale_x=None, scale_y=None):
+        if x is not None:
+            self.x = x
+        if y is not None:
+            self.y = y
+        if rotation is not None:
+            self.rotation = rotation
+        if scale is not None:
+            self.scale = scale
+        if scale_x is not None:
+            self.scale_x = scale_x
+        if scale_y is not None:
+            self.scale_y = scale_y
+
+    def draw(self):
+        pass
+
+    def delete(self):
+        pass
+
+
+class NullLabel(object):
+    def __init__(self, text='', **kwargs):
+        self.text = text
+        for name, value in kwargs.items():
+            setattr(self, name, value)
+
+    def draw(self):
+        pass
+
+    def delete(self):
+        pass
+
+
+class NullSource(object):
+    audio_format = None
+    video_format = None
+    duration = 0
+
+    def get_queue_source(self):
+        return self
+
+
+class NullSourceGroup(NullSource):
+    def __init__(self, audio_format=None, video_format=None):
+        self.loop = False
+        self.sources = []
+
+    def queue(self, source):
+        self.sources.append(source)
+
+
+class NullPlayer(object):
+    def __init__(self):
+        self.volume = 1.0
+        self.pitch = 1.0
+        self.playing = False
+        self.source = None
+
+    def queue(self, source):
+        self.source = source
+
+    def play(self):
+        self.playing = True
+
+    def pause(self):
+        self.playing = False
+
+    def seek(self, time):
+        pass
+
+    def next_source(self):
+        pass
+
+    def delete(self):
+        self.playing = False
+
+
+def null_image_load(filename, file=None, decoder=None):
+    # only the PNG header is read, images are never decoded
+    if file is None:
+        with open(filename, 'rb') as image_file:
+            header = image_file.read(24)
+    else:
+        header = file.read(24)
+    if header[:8] == b'\x89PNG\r\n\x1a\n':
+        return NullImage(*struct.unpack('>II', header[16:24]))
+    return NullImage()
+
+
+def null_loader_image(loader, name, flip_x=False, flip_y=False, rotate=0,
+                      atlas=True):
+    with loader.file(name) as image_file:
+        return null_image_load(name, image_file)
+
+
+def null_image(name, flip_x=False, flip_y=False, rotate=0, atlas=True):
+    return null_loader_image(pyglet.resource, name)
+
+
+def null_load(filename, file=None, decoder=None, streaming=True):
+    return NullSource()
+
+
+def null_font(name=None, size=None, bold=False, italic=False, dpi=None):
+    return NullFont(name, size, dpi)
+
+
+def enable():
+    global enabled
+    if enabled:
+        return
+    if 'engine.resources' in sys.modules:
+        raise RuntimeError('headless.enable() must be called before '
+                           'engine.resources is imported')
+    pyglet.options['shadow_window'] = False
+    pyglet.options['audio'] = ('silent',)
+
+    # imported only after the options above are set
+    import pyglet.sprite as sprite
+    import pyglet.text as text
+    import pyglet.resource as resource
+    import pyglet.media as media
+    import pyglet.font as font
+    import pyglet.image as image
+
+    sprite.Sprite = NullSprite
+    text.Label = NullLabel
+    resource.image = null_image
+    resource.Loader.image = null_loader_image
+    image.load = null_image_load
+    media.load = null_load
+    media.Player = NullPlayer
+    media.SourceGroup = NullSourceGroup
+    font.load = null_font
+    enabled = True
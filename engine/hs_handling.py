@@ -1,28 +1,173 @@
-def get_highscores(filename):
-    try:
-        with open(filename, 'r', encoding='utf-8') as hs_file:
-            highscores = list()
-            line = hs_file.readline()
-            while line:
-                name, score = line.rstrip('\n').split(',')
-                highscores.append((name, float(score)))
-                line = hs_file.readline()
-        return tuple(highscores)
-    except FileNotFoundError:
-        return None
-
-def add_highscore(filename, name, score, ascending=True):
-    current_hs = get_highscores(filename)
-    if current_hs: # highscore found
-        current_hs = list(current_hs)
-        current_hs.append((name, score))
-        print(current_hs)
-        current_hs = sorted(current_hs, 
-                            key=lambda item: item[1], reverse=not ascending)
-        current_hs = current_hs[0:50] # only store top 50
-    else: # no highscore yet
-        current_hs = ((name, score),)
-    with open(filename, 'w', encoding='utf-8') as hs_file:
-        for highscore in current_hs:
-            name, score = highscore
-            hs_file.write('{},{}\n'.format(name, score))
+import os
+import sqlite3
+import threading
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+
+# highscores of all games in one sqlite database. every score ever entered
+# is kept, an index on (game, score) makes an insert and reading the top of
+# a game's leaderboard logarithmic in the number of scores. each write is a
+# transaction, a crash leaves the scores as they were before it. the game
+# enters scores through a ScoreWriter, which writes them on a worker thread
+
+class ScoreStore(object):
+    def __init__(self, filename='highscores.db'):
+        self.filename = filename
+        self._connection = None
+        # the connection is shared by the game and the writer thread
+        self.lock = threading.RLock()
+
+    @property
+    def connection(self):
+        # opened on first use
+        with self.lock:
+            if self._connection is None:
+                self._connection = sqlite3.connect(
+                    self.filename, check_same_thread=False)
+                self.create_tables()
+            return self._connection
+
+    def create_tables(self):
+        with self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS scores ('
+                'id INTEGER PRIMARY KEY, game TEXT NOT NULL, '
+                'name TEXT NOT NULL, score REAL NOT NULL)')
+            self.connection.execute(
+                'CREATE INDEX IF NOT EXISTS scores_by_game '
+                'ON scores (game, score)')
+            # old csv highscore files already copied in
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS imported (filename TEXT PRIMARY KEY)')
+
+    def add(self, game, name, score):
+        with self.lock, self.connection:
+            self.connection.execute(
+                'INSERT INTO scores (game, name, score) VALUES (?, ?, ?)',
+                (game, name, score))
+
+    def top(self, game, limit=50, ascending=True):
+        # ((name, score), ...) best first, ties in the order they were added
+        order = 'ASC' if ascending else 'DESC'
+        with self.lock:
+            return tuple(self.connection.execute(
+                'SELECT name, score FROM scores WHERE game = ? '
+                'ORDER BY score {}, id LIMIT ?'.format(order), (game, limit)))
+
+    def count(self, game):
+        with self.lock:
+            return self.connection.execute(
+                'SELECT COUNT(*) FROM scores WHERE game = ?',
+                (game,)).fetchone()[0]
+
+    def import_csv(self, game, filename):
+        # copies the name,score lines of a highscore file written by earlier
+        # versions, once. the file is left in place
+        if not os.path.exists(filename):
+            return 0
+        key = os.path.abspath(filename)
+        with self.lock, self.connection:
+            if self.connection.execute(
+                    'SELECT 1 FROM imported WHERE filename = ?',
+                    (key,)).fetchone():
+                return 0
+            rows = []
+            with open(filename, 'r', encoding='utf-8') as hs_file:
+                for line in hs_file:
+                    name, score = line.rstrip('\n').rsplit(',', 1)
+                    rows.append((game, name, float(score)))
+            self.connection.executemany(
+                'INSERT INTO scores (game, name, score) VALUES (?, ?, ?)', rows)
+            self.connection.execute(
+                'INSERT INTO imported (filename) VALUES (?)', (key,))
+        return len(rows)
+
+    def close(self):
+        with self.lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+class ScoreWriter(object):
+    # write-behind in front of a ScoreStore. submit puts a score on the
+    # leaderboards kept in memory at once and queues the insert for a worker
+    # thread, so the frame a name is entered in never waits for the disk.
+    # a leaderboard is read from the store the first time it is shown, after
+    # the queued inserts are written
+    def __init__(self, store, board_size=50):
+        self.store = store
+        self.board_size = board_size
+        self.executor = ThreadPoolExecutor(1)
+        self.queued = [] # futures of inserts that may not be written yet
+        self.boards = dict() # (game, ascending): [(name, score), ...]
+
+    def submit(self, game, name, score):
+        self.queued = [future for future in self.queued if not future.done()]
+        future = self.executor.submit(self.store.add, game, name, score)
+        future.add_done_callback(self.report)
+        self.queued.append(future)
+        for (board_game, ascending), board in self.boards.items():
+            if board_game != game:
+                continue
+            # after the equal scores, like the store orders ties
+            keys = [entry[1] if ascending else -entry[1] for entry in board]
+            board.insert(bisect_right(keys, score if ascending else -score),
+                         (name, score))
+            del board[self.board_size:]
+
+    def report(self, future):
+        if future.exception():
+            print('highscore not saved: {}'.format(future.exception()))
+
+    def top(self, game, ascending=True):
+        # the best board_size scores of a game, best first
+        key = (game, ascending)
+        if key not in self.boards:
+            self.flush()
+            self.boards[key] = list(
+                self.store.top(game, self.board_size, ascending))
+        return tuple(self.boards[key])
+
+    def flush(self):
+        # waits until every submitted score is written
+        for future in self.queued:
+            future.exception()
+        self.queued = []
+
+    def close(self):
+        # flushes and closes the store, the game registers it to run at exit
+        self.executor.shutdown(wait=True)
+        self.queued = []
+        self.store.close()
+
+class LeaderboardCache(object):
+    # the leaderboards as the score and name columns the highscore screens
+    # show. a game's columns are formatted the first time they are shown and
+    # again only after a score of that game is submitted, from the boards
+    # the writer keeps in memory. csv files of earlier versions are imported
+    # before a game's board is first read
+    def __init__(self, writer, ascending, csv_filename='{}.csv'):
+        self.writer = writer
+        self.ascending = ascending # game: True when lower scores are better
+        self.csv_filename = csv_filename
+        self.cached = dict() # game: (scores, names) or None without scores
+        self.imported = set()
+
+    def columns(self, game):
+        if game not in self.cached:
+            if self.csv_filename and game not in self.imported:
+                self.writer.store.import_csv(
+                    game, self.csv_filename.format(game))
+                self.imported.add(game)
+            board = self.writer.top(game, self.ascending[game])
+            if board:
+                self.cached[game] = (
+                    ''.join('{:>5.1f}\n'.format(score) for name, score in board),
+                    ''.join('{:<32}\n'.format(name) for name, score in board))
+            else:
+                self.cached[game] = None
+        return self.cached[game]
+
+    def submit(self, game, name, score):
+        self.writer.submit(game, name, score)
+        self.cached.pop(game, None)
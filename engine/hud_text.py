@@ -0,0 +1,102 @@
+import pyglet
+from pyglet.text.layout import TextLayoutGroup, TextLayoutTextureGroup
+
+DIGITS = '0123456789.-+ '
+
+class HudText(object):
+    # a line of text for the numbers on screen that change every frame. the
+    # glyphs of charset are fetched once, setting text writes the quads of
+    # its characters into fixed vertex lists (one per glyph texture) and
+    # does nothing when the string didn't change. a pyglet label lays out
+    # its whole document again on every assignment. characters outside
+    # charset are added on first use
+    def __init__(self, text='', font_name=None, font_size=12, x=0, y=0,
+                 color=(255, 255, 255, 255), anchor_x='left',
+                 anchor_y='baseline', batch=None, group=None, charset=DIGITS):
+        self.font = pyglet.font.load(font_name, font_size)
+        self.x = x
+        self.y = y
+        self.color = color
+        self.anchor_x = anchor_x
+        self.anchor_y = anchor_y
+        self.batch = batch
+        self.top_group = TextLayoutGroup(group)
+        self.capacity = max(8, len(text)) # characters per vertex list
+        self.glyphs = dict() # character: glyph
+        self.vertex_lists = dict() # glyph texture: vertex list
+        for character in charset + text:
+            self.glyph(character)
+        self._text = None
+        self.text = text
+
+    def glyph(self, character):
+        if character not in self.glyphs:
+            glyph = self.font.get_glyphs(character)[0]
+            self.glyphs[character] = glyph
+            if glyph.owner not in self.vertex_lists:
+                self.vertex_lists[glyph.owner] = self.create_vertex_list(
+                    glyph.owner)
+        return self.glyphs[character]
+
+    def create_vertex_list(self, texture):
+        count = self.capacity * 4
+        return self.batch.add(
+            count, pyglet.gl.GL_QUADS,
+            TextLayoutTextureGroup(texture, self.top_group),
+            'v2f/dynamic', 't3f/dynamic', ('c4B', self.color * count))
+
+    def grow(self, capacity):
+        self.capacity = capacity
+        for texture, vertex_list in self.vertex_lists.items():
+            vertex_list.delete()
+            self.vertex_lists[texture] = self.create_vertex_list(texture)
+
+    @property
+    def text(self):
+        return self._text
+
+    @text.setter
+    def text(self, text):
+        if text == self._text:
+            return
+        self._text = text
+        glyphs = [self.glyph(character) for character in text]
+        if len(text) > self.capacity:
+            self.grow(len(text) * 2)
+        width = sum(glyph.advance for glyph in glyphs)
+        if self.anchor_x == 'right':
+            x = self.x - width
+        elif self.anchor_x == 'center':
+            x = self.x - width // 2
+        else:
+            x = self.x
+        if self.anchor_y == 'bottom':
+            y = self.y - self.font.descent
+        elif self.anchor_y == 'top':
+            y = self.y - self.font.ascent
+        elif self.anchor_y == 'center':
+            y = self.y - (self.font.ascent + self.font.descent) // 2
+        else:
+            y = self.y
+        x, y = int(x), int(y)
+
+        vertices = {texture: [] for texture in self.vertex_lists}
+        tex_coords = {texture: [] for texture in self.vertex_lists}
+        for glyph in glyphs:
+            x0, y0, x1, y1 = glyph.vertices
+            vertices[glyph.owner].extend((x + x0, y + y0, x + x1, y + y0,
+                                          x + x1, y + y1, x + x0, y + y1))
+            tex_coords[glyph.owner].extend(glyph.tex_coords)
+            x += glyph.advance
+        # the unused quads of a list collapse to a point
+        for texture, vertex_list in self.vertex_lists.items():
+            quads = vertices[texture]
+            unused = self.capacity * 8 - len(quads)
+            vertex_list.vertices[:] = quads + [0] * unused
+            vertex_list.tex_coords[:] = (tex_coords[texture] +
+                                         [0] * (unused // 8 * 12))
+
+    def delete(self):
+        for vertex_list in self.vertex_lists.values():
+            vertex_list.delete()
+        self.vertex_lists = dict()
@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+import random
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy
+
+# a level id identifies one generated course. every generator of a level
+# draws from its own stream derived from the id, so the same id always
+# regenerates the same terrain, obstacles and background
+
+
+def new_level_id():
+    return random.getrandbits(32)
+
+
+def make_random(seed=None):
+    # generators accept either a seed or a random.Random instance
+    if isinstance(seed, random.Random):
+        return seed
+    return random.Random(seed)
+
+
+def level_random(level_id, name):
+    # str seeds are hashed with sha512, stable across runs and platforms
+    return random.Random('{}:{}'.format(level_id, name))
+
+
+class LevelCache(object):
+    # generated level arrays stored as .npz files keyed by the level id and
+    # the generator options. bump version whenever generation changes.
+    # a directory of None disables caching. at most `limit` levels are
+    # kept, the least recently used are removed first
+    version = 1
+
+    def __init__(self, directory='level_cache', limit=256, stale=3600):
+        self.directory = directory
+        self.limit = limit
+        self.stale = stale # seconds before a left over .tmp file is removed
+
+    def key(self, level_id, options):
+        text = json.dumps([self.version, level_id, options], sort_keys=True)
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+    def load(self, key):
+        path = self.path(key)
+        try:
+            with numpy.load(path) as data:
+                arrays = {name: data[name] for name in data.files}
+        except (OSError, EOFError, ValueError, zipfile.BadZipFile):
+            return None # not cached yet or a damaged file
+        try:
+            os.utime(path) # the modification time orders evict
+        except OSError:
+            pass
+        return arrays
+
+    def save(self, key, arrays):
+        os.makedirs(self.directory, exist_ok=True)
+        # written to a temporary file first, readers never see half a level
+        handle, temp_path = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        try:
+            with os.fdopen(handle, 'wb') as level_file:
+                numpy.savez(level_file, **arrays)
+            os.replace(temp_path, self.path(key))
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def evict(self):
+        # removes the least recently used levels over the limit and the
+        # temporary files of processes killed while saving. files another
+        # process removes or still has open are skipped
+        now = time.time()
+        levels = []
+        for entry in os.scandir(self.directory):
+            try:
+                modified = entry.stat().st_mtime
+                if entry.name.endswith('.npz'):
+                    levels.append((modified, entry.path))
+                elif entry.name.endswith('.tmp') and now-modified > self.stale:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+        levels.sort()
+        for modified, path in levels[:max(0, len(levels)-self.limit)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def get(self, level_id, options, generate, store=True):
+        # returns the cached arrays, calls generate() on a miss and stores
+        # its result if store is set. levels of random ids are rarely asked
+        # for again, storing them only fills the directory
+        if self.directory is None:
+            return generate()
+        key = self.key(level_id, options)
+        arrays = self.load(key)
+        if arrays is None:
+            arrays = generate()
+            if store:
+                try:
+                    self.save(key, arrays)
+                    self.evict()
+                except OSError as error:
+                    print('level cache: {}'.format(error))
+        return arrays
+
+
+class LevelPreloader(object):
+    # builds levels on a worker thread before they are needed, e.g. while
+    # the menu button of a game is hovered. only the level arrays are built
+    # there, the mode still adds them to the space and batch itself. at most
+    # `limit` levels are kept, the oldest is dropped first
+    def __init__(self, limit=4):
+        self.executor = ThreadPoolExecutor(1)
+        self.limit = limit
+        self.pending = dict() # key: future
+
+    def preload(self, key, build):
+        if key in self.pending:
+            return
+        self.pending[key] = self.executor.submit(build)
+        if len(self.pending) > self.limit:
+            self.pending.pop(next(iter(self.pending))).cancel()
+
+    def take(self, key):
+        # the preloaded level or None, waits when it is still being built
+        future = self.pending.pop(key, None)
+        if future is None or future.cancelled():
+            return None
+        return future.result()
@@ -1,66 +1,165 @@
-from random import randint, gauss, uniform
 from math import sin, cos, pi
 
+import numpy
 import pyglet
 import pymunk
 
+from engine.level import make_random
+
+
+def generate_obstacles(end_coordinate=30000, radius_range=(10, 40),
+                       frequency=125, amount=4, x_offset=0, min_height=380,
+                       seed=None):
+    # returns the (count, 2) spawn positions sorted by x and the
+    # (count, 6, 2) hexagon vertices of every obstacle around its position
+    rng = make_random(seed)
+    original_coords = [(round(cos(x*(pi/3)), 4), round(sin(x*(pi/3)), 4)) for x in range(6)]
+    positions = []
+    local_coords = []
+    for i in range(0, end_coordinate+1, frequency):
+        activated = True if -sin((i+1+x_offset)/500) > 0 else False
+        if activated:
+            for j in range(rng.randint(0, amount)):
+                mid_radius = (radius_range[0]+radius_range[1])//2
+                radius = mid_radius + (mid_radius-radius_range[0])*(rng.gauss(0, 0.2))
+
+                pymunk_coords = []
+                for k in range(6):
+                    random_change = rng.uniform(-radius/3, radius/3)
+                    pymunk_coords.append(
+                        (original_coords[k][0]*(radius+random_change), original_coords[k][1]*(radius+random_change)))
+                positions.append((i, min_height + j*80))
+                local_coords.append(pymunk_coords)
+    return (numpy.array(positions, dtype=float).reshape(-1, 2),
+            numpy.array(local_coords, dtype=float).reshape(-1, 6, 2))
+
 
 class Obstacles(object):
     def __init__(self, batch, space, window, end_coordinate=30000, radius_range=(10, 40), 
                  mass=1, frequency=125, amount=4, x_offset=0, min_height=380,
-                 group=None):
+                 seed=None, layout=None, group=None):
+        # layout is a precomputed (positions, local_coords) pair as returned
+        # by generate_obstacles, see LevelCache
         self.batch = batch
         self.space = space
         self.window = window
         color = (221, 139, 67) + (135, 85, 40) + (100, 40, 20)
-        original_coords = [(round(cos(x*(pi/3)), 4), round(sin(x*(pi/3)), 4)) for x in range(6)]
-        self.obstacle_bodies = []
-        self.obstacle_shapes = []
-        self.obstacle_primitives = []
-
-        for i in range(0, end_coordinate+1, frequency):
-            activated = True if -sin((i+1+x_offset)/500) > 0 else False
-            if activated:
-                for j in range(randint(0, amount)):
-                    mid_radius = (radius_range[0]+radius_range[1])//2
-                    radius = mid_radius + (mid_radius-radius_range[0])*(gauss(0, 0.2))
-
-                    pymunk_coords = []
-                    for k in range(6):
-                        random_change = uniform(-radius/3, radius/3)
-                        pymunk_coords.append(
-                            (original_coords[k][0]*(radius+random_change), original_coords[k][1]*(radius+random_change)))
-
-                    obstacle_moment = pymunk.moment_for_poly(mass, pymunk_coords)
-                    obstacle_body = pymunk.Body(mass, obstacle_moment)
-                    obstacle_body.position = i, min_height + j*80
-                    obstacle_shape = pymunk.Poly(obstacle_body, pymunk_coords)
-                    obstacle_shape.filter = pymunk.ShapeFilter(categories=0b0000100, mask=0b1111111)
-                    obstacle_shape.elasticity = 0.7
-                    obstacle_shape.friction = 0.9
-                    self.obstacle_bodies.append(obstacle_body)
-                    self.obstacle_shapes.append(obstacle_shape)
-
-                    pyglet_coords = []
-                    for coord in pymunk_coords:
-                        pyglet_coords.extend(coord)
-
-                    self.obstacle_primitives.append(self.batch.add_indexed(
-                        6, pyglet.gl.GL_TRIANGLES, group,
-                        [0, 1, 5, 1, 2, 5, 2, 4, 5, 2, 3, 4],
-                        ('v2f', pyglet_coords),
-                        ('c3B', color*2)
-                    ))
-        self.space.add(*self.get_physical_object())
+        self.mass = mass
+        # obstacles are only added to the space once the terrain under them
+        # is streamed in, see Terrain.stream. all obstacles share one vertex
+        # list in world coordinates, draw it in a CameraGroup
+        self.query_filter = pymunk.ShapeFilter(mask=0b0000100)
+
+        if layout is None:
+            layout = generate_obstacles(end_coordinate, radius_range, frequency,
+                                        amount, x_offset, min_height, seed)
+        self.positions, self.local_coords = layout # sorted by x
+        self.count = len(self.positions)
+
+        # inactive obstacles are collapsed to a point so they are not drawn
+        self.primitive = None
+        if self.count:
+            indices = numpy.array((0, 1, 5, 1, 2, 5, 2, 4, 5, 2, 3, 4)) + 6*numpy.arange(self.count)[:, None]
+            self.primitive = self.batch.add_indexed(
+                6*self.count, pyglet.gl.GL_TRIANGLES, group,
+                indices.ravel().tolist(),
+                ('v2f/stream', [0]*12*self.count),
+                ('c3B', color*2*self.count)
+            )
+        self.reset(space)
+
+    def reset(self, space):
+        # every obstacle back at its spawn position, also used to restart
+        # the course on a new space
+        self.space = space
+        self.next_spec = 0
+        self.active = dict() # shape: obstacle index
+        # (x, y, angle) of every obstacle at the last two game ticks, only
+        # kept up to date for the obstacles on screen, see interpolate
+        self.previous = numpy.zeros((self.count, 3))
+        self.current = numpy.zeros((self.count, 3))
+        self.on_screen = numpy.zeros(self.count, dtype=bool)
+        self.visible = numpy.zeros(0, dtype=int)
+        if self.count:
+            self.vertices()[:] = 0
+        self.stream()
 
     def get_physical_object(self):
-        return self.obstacle_bodies + self.obstacle_shapes
+        physical_objects = []
+        for shape in self.active:
+            physical_objects.extend((shape.body, shape))
+        return physical_objects
+
+    def stream(self, x_offset=0):
+        margin = self.window.width
+        left, right = x_offset-margin, x_offset+self.window.width+margin
+        while self.next_spec < self.count:
+            position = self.positions[self.next_spec]
+            if position[0] > right:
+                break
+            if position[0] >= left:
+                self.__activate(self.next_spec)
+            self.next_spec += 1
+        for shape, index in list(self.active.items()):
+            # behind the camera or fell off the streamed terrain
+            if shape.body.position.x < left or shape.body.position.y < -200:
+                self.space.remove(shape.body, shape)
+                self.vertices()[index] = 0
+                del self.active[shape]
+
+    def __activate(self, index):
+        pymunk_coords = self.local_coords[index].tolist()
+        obstacle_moment = pymunk.moment_for_poly(self.mass, pymunk_coords)
+        obstacle_body = pymunk.Body(self.mass, obstacle_moment)
+        obstacle_body.position = tuple(self.positions[index])
+        obstacle_shape = pymunk.Poly(obstacle_body, pymunk_coords)
+        obstacle_shape.filter = pymunk.ShapeFilter(categories=0b0000100, mask=0b1111111)
+        obstacle_shape.elasticity = 0.7
+        obstacle_shape.friction = 0.9
+        self.space.add(obstacle_body, obstacle_shape)
+        self.active[obstacle_shape] = index
+        self.current[index] = (*obstacle_body.position, obstacle_body.angle)
+        self.__transform([index], self.current[[index]])
+
+    def vertices(self):
+        # (count, 6, 2) view straight into the shared vertex buffer
+        return numpy.ctypeslib.as_array(self.primitive.vertices).reshape(-1, 6, 2)
+
+    def __transform(self, indices, states):
+        position = states[:, :2]
+        angle = states[:, 2:]
+        cos_a, sin_a = numpy.cos(angle), numpy.sin(angle)
+        local = self.local_coords[indices]
+        vertices = self.vertices()
+        vertices[indices, :, 0] = local[:, :, 0]*cos_a - local[:, :, 1]*sin_a + position[:, :1]
+        vertices[indices, :, 1] = local[:, :, 0]*sin_a + local[:, :, 1]*cos_a + position[:, 1:]
 
     def update(self, x_offset=0):
-        for i in range(len(self.obstacle_bodies)):
-            if -60 < self.obstacle_bodies[i].position.x-x_offset < self.window.width + 60:
-                pyglet_coords = []
-                for v in self.obstacle_shapes[i].get_vertices():
-                    x, y = v.rotated(self.obstacle_shapes[i].body.angle) + self.obstacle_shapes[i].body.position
-                    pyglet_coords.extend((x-x_offset, y))
-                self.obstacle_primitives[i].vertices = pyglet_coords
+        self.stream(x_offset)
+        # the space's bounding box tree finds the obstacles on screen
+        on_screen = pymunk.BB(x_offset-60, -10000, x_offset+self.window.width+60, 10000)
+        indices = []
+        states = []
+        for shape in self.space.bb_query(on_screen, self.query_filter):
+            if shape in self.active:
+                indices.append(self.active[shape])
+                states.append((*shape.body.position, shape.body.angle))
+        indices = numpy.array(indices, dtype=int)
+        states = numpy.array(states).reshape(-1, 3)
+        # obstacles that just came on screen have no previous state to
+        # interpolate from
+        was_on_screen = self.on_screen[indices][:, None]
+        self.previous[indices] = numpy.where(was_on_screen, self.current[indices], states)
+        self.current[indices] = states
+        self.on_screen[:] = False
+        self.on_screen[indices] = True
+        self.visible = indices
+        if len(indices):
+            self.__transform(indices, states)
+
+    def interpolate(self, alpha):
+        indices = self.visible
+        if len(indices):
+            previous = self.previous[indices]
+            states = previous + (self.current[indices]-previous)*alpha
+            self.__transform(indices, states)
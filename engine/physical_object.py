@@ -3,18 +3,31 @@ import pyglet
 import pymunk
 from . import resources
 
+def lerp_transform(previous, current, alpha):
+    return [a + (b-a)*alpha for a, b in zip(previous, current)]
+
 class PhysicalObject(object):
     def __init__(self, body, sprite, rotation_offset=0):
         self.body = body
         self.sprite = sprite
         self.rotation_offset = rotation_offset
+        # sprite transforms of the last two game ticks, see interpolate
+        self.previous = None
+        self.current = None
 
     def update(self, x_offset=0):
-        self.sprite.update(
-            x=self.body.position.x - x_offset,
-            y=self.body.position.y,
-            rotation=-degrees(self.body.angle) + self.rotation_offset
-        )
+        transform = (self.body.position.x - x_offset, self.body.position.y,
+                     -degrees(self.body.angle) + self.rotation_offset)
+        self.previous = self.current or transform
+        self.current = transform
+        x, y, rotation = transform
+        self.sprite.update(x=x, y=y, rotation=rotation)
+
+    def interpolate(self, alpha):
+        # alpha is how far the drawn frame is between the last two ticks
+        if self.current:
+            x, y, rotation = lerp_transform(self.previous, self.current, alpha)
+            self.sprite.update(x=x, y=y, rotation=rotation)
 
 class GameBall(PhysicalObject):
     def __init__(self, batch, space, position, radius, group=None):
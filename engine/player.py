@@ -6,7 +6,6 @@ import pymunk
 
 from . import resources
 from .physical_object import PhysicalObject
-from .sound_loop import SoundLoop
 
 def mapFromTo(x, a, b, c, d):
     y=(x-a)/(b-a)*(d-c)+c
@@ -56,6 +55,31 @@ class Vehicle(object):
                 0, (self.speed+4), self.min_pitch, self.max_pitch
             )
 
+    def interpolate(self, alpha):
+        for physical_object in self.physical_objects:
+            physical_object.interpolate(alpha)
+
+    def delete(self):
+        # sprites and the engine sound, the bodies go with their space
+        for sprite in self.sprites:
+            sprite.delete()
+        if self.engine_sound:
+            self.engine_sound.release()
+            self.engine_sound = None
+
+    def joint_error(self, joints=None):
+        # largest gap between the two anchors of the pivot joints, a pixel
+        # or more means the solver can't hold the vehicle together
+        if joints is None:
+            joints = [constraint for constraint in self.constraints
+                      if isinstance(constraint, pymunk.PivotJoint)]
+        error = 0
+        for joint in joints:
+            anchor_a = joint.a.local_to_world(joint.anchor_a)
+            anchor_b = joint.b.local_to_world(joint.anchor_b)
+            error = max(error, anchor_a.get_distance(anchor_b))
+        return error
+
     def forward(self):
         for motor in self.motors:
             motor.max_force = self.torque
@@ -83,13 +107,17 @@ class Vehicle(object):
 class Tank(Vehicle):
     name = 'tank'
     def __init__(self, batch, space, window, position, side='left', 
-                 add_boxlives=False, torque=300000, speed=40*pi, group=None):
+                 add_boxlives=False, torque=300000, speed=40*pi,
+                 spring_stiffness=250, spring_damping=20, group=None):
         super().__init__(batch, space, window, position, side=side,
                          torque=torque, speed=speed)
         self.add_boxlives = add_boxlives
+        self.spring_stiffness = spring_stiffness # middle wheel suspension
+        self.spring_damping = spring_damping
 
         self.head = None
         self.threads = []
+        self.thread_joints = []
         self.boxlives = []
 
         self.__build_tank()
@@ -103,8 +131,7 @@ class Tank(Vehicle):
         self.space.add(self.get_physical_object())
 
         self.min_pitch, self.max_pitch = 0.2, 1.2
-        self.engine_sound = SoundLoop(resources.engine_sfx)
-        self.engine_sound.play()
+        self.engine_sound = self.window.engine_voices.acquire()
 
     def boxlife_coll_sep(self, arbiter, space, data):
         boxlife_shape, sensor_shape = arbiter.shapes # box, sensor
@@ -227,7 +254,7 @@ class Tank(Vehicle):
 
             if i not in (0, 4):
                 wheel_gj = pymunk.GrooveJoint(self.chassis.body, wheel_body, (wheel_body.position.x-self.chassis.body.position.x, 30), (wheel_body.position.x-self.chassis.body.position.x, -60), (0, 0))
-                wheel_ds = pymunk.DampedSpring(self.chassis.body, wheel_body, (wheel_body.position.x-self.chassis.body.position.x, 30), (0, 0), 95, 250, 20)
+                wheel_ds = pymunk.DampedSpring(self.chassis.body, wheel_body, (wheel_body.position.x-self.chassis.body.position.x, 30), (0, 0), 95, self.spring_stiffness, self.spring_damping)
                 self.constraints.append(wheel_gj)
                 self.constraints.append(wheel_ds)
             else:
@@ -307,13 +334,20 @@ class Tank(Vehicle):
             j = (i + 1) % (2*(x_amount+y_amount))
             thread_joint = pymunk.PivotJoint(self.threads[i].body, self.threads[j].body, joint_coord)
             self.constraints.append(thread_joint)
+            self.thread_joints.append(thread_joint)
 
 class MotorBike(Vehicle):
     name = 'motorbike'
     def __init__(self, batch, space, window, position,
-                 torque=120000, speed=11*pi, group=None):
+                 torque=120000, speed=11*pi, spring_stiffness=70,
+                 spring_damping=7, front_spring_stiffness=60,
+                 front_spring_damping=7, group=None):
         super().__init__(batch, space, window, position,
                          torque=torque, speed=speed)
+        self.spring_stiffness = spring_stiffness # rear wheel suspension
+        self.spring_damping = spring_damping
+        self.front_spring_stiffness = front_spring_stiffness
+        self.front_spring_damping = front_spring_damping
 
         self.__build_motorbike()
         for sprite in self.sprites:
@@ -323,8 +357,7 @@ class MotorBike(Vehicle):
         self.space.add(self.get_physical_object())
 
         self.min_pitch, self.max_pitch = 1, 3
-        self.engine_sound = SoundLoop(resources.engine_sfx)
-        self.engine_sound.play()
+        self.engine_sound = self.window.engine_voices.acquire()
 
     def on_key_release(self, symbol, modifiers):
         if symbol in (key.D, key.A):
@@ -440,7 +473,8 @@ class MotorBike(Vehicle):
         wheel1_pj2 = pymunk.PivotJoint(holder_body, self.chassis.body,
             (holder_body.position.x+45, holder_body.position.y+7.5))
         self.constraints.append(wheel1_pj2)
-        wheel1_ds = pymunk.DampedSpring(holder_body, self.chassis.body, holder_pos2, (-105, 40), 110, 70, 7)
+        wheel1_ds = pymunk.DampedSpring(holder_body, self.chassis.body, holder_pos2, (-105, 40), 110,
+                                       self.spring_stiffness, self.spring_damping)
         self.constraints.append(wheel1_ds)
         wheel1_m = pymunk.SimpleMotor(self.chassis.body, wheel1_body, 3*pi)
         wheel1_m.max_force = 0
@@ -466,7 +500,8 @@ class MotorBike(Vehicle):
         wheel2_gj = pymunk.GrooveJoint(self.chassis.body, wheel2_body, 
             (70, 0), (105, -55), (0, 0))
         self.constraints.append(wheel2_gj)
-        wheel2_ds = pymunk.DampedSpring(wheel2_body, self.chassis.body, (0, 0), (50, 35), 110, 60, 7)
+        wheel2_ds = pymunk.DampedSpring(wheel2_body, self.chassis.body, (0, 0), (50, 35), 110,
+                                       self.front_spring_stiffness, self.front_spring_damping)
         self.constraints.append(wheel2_ds)
 
 class VbVehicle(Vehicle):
@@ -483,8 +518,7 @@ class VbVehicle(Vehicle):
         self.space.add(self.get_physical_object())
 
         self.min_pitch, self.max_pitch = 1, 2
-        self.engine_sound = SoundLoop(resources.engine_sfx)
-        self.engine_sound.play()
+        self.engine_sound = self.window.engine_voices.acquire()
         self.event_handlers = []
 
     def __build_vehicle(self):
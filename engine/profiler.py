@@ -0,0 +1,174 @@
+import csv
+import json
+from collections import deque
+from contextlib import contextmanager
+from time import perf_counter
+
+import pyglet
+
+# frame profiler: game code times its parts with
+#
+#     with window.profiler.section('terrain'):
+#         self.terrain.update(offset)
+#
+# and the window closes every drawn frame with end_frame(). the last
+# `history` frames are kept for the overlay and for dumps attached to
+# performance bug reports
+
+
+class FrameProfiler(object):
+    def __init__(self, history=600):
+        self.frames = deque(maxlen=history) # dicts of section: seconds
+        self.current = dict()
+        self.order = [] # section names in the order first seen
+        self.counters = dict() # latest value of per frame counts
+        self.frame_start = perf_counter()
+
+    @contextmanager
+    def section(self, name):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = perf_counter()-start
+            if name not in self.current:
+                self.current[name] = 0.0
+                if name not in self.order:
+                    self.order.append(name)
+            self.current[name] += elapsed
+
+    def count(self, name, value):
+        self.counters[name] = value
+
+    def end_frame(self):
+        now = perf_counter()
+        self.current['frame'] = now-self.frame_start
+        self.frame_start = now
+        self.frames.append(self.current)
+        self.current = dict()
+
+    def stats(self):
+        # section: (mean, p50, p95, max) in milliseconds over the history
+        stats = dict()
+        for name in ['frame'] + self.order:
+            times = sorted(frame.get(name, 0.0)*1000 for frame in self.frames)
+            if times:
+                stats[name] = (sum(times)/len(times), times[len(times)//2],
+                               times[min(len(times)-1, int(len(times)*0.95))],
+                               times[-1])
+        return stats
+
+    def histogram(self, name='frame', bin_ms=2, bins=17):
+        # frame counts per bin_ms wide bin, the last bin collects the rest
+        counts = [0]*bins
+        for frame in self.frames:
+            index = int(frame.get(name, 0.0)*1000/bin_ms)
+            counts[min(index, bins-1)] += 1
+        return counts
+
+    def dump(self, filename):
+        # csv with one row per frame, or json with the rows and the summary
+        columns = ['frame'] + self.order
+        rows = [[round(frame.get(name, 0.0)*1000, 4) for name in columns]
+                for frame in self.frames]
+        if filename.endswith('.csv'):
+            with open(filename, 'w', newline='') as profile_file:
+                writer = csv.writer(profile_file)
+                writer.writerow(name + '_ms' for name in columns)
+                writer.writerows(rows)
+        else:
+            summary = {name: dict(zip(('mean', 'p50', 'p95', 'max'), values))
+                       for name, values in self.stats().items()}
+            with open(filename, 'w') as profile_file:
+                json.dump(dict(columns=columns, frames_ms=rows,
+                               summary_ms=summary, counters=self.counters),
+                          profile_file, indent=1)
+
+
+def batch_stats(batch):
+    # (draw calls, textures) of a batch.draw(). every vertex domain with
+    # vertices left is one draw call, sprites only share a domain when they
+    # share a group and a texture. this reads pyglet's private batch
+    # internals, None if this pyglet doesn't have them
+    group_map = getattr(batch, 'group_map', None)
+    if group_map is None:
+        return None
+    draw_calls = 0
+    textures = set()
+    for group, domains in group_map.items():
+        drawn = [domain for domain in domains.values()
+                 if not getattr(domain, '_is_empty', lambda: False)()]
+        draw_calls += len(drawn)
+        texture = getattr(group, 'texture', None)
+        if drawn and texture is not None:
+            textures.add(getattr(texture, 'id', id(texture)))
+    return draw_calls, len(textures)
+
+
+class ProfilerOverlay(object):
+    # section timings and a frame time histogram, drawn over the game
+    def __init__(self, profiler, window, refresh=15):
+        self.profiler = profiler
+        self.window = window
+        self.refresh = refresh # frames between text updates
+        self.visible = False
+        self.frames = 0
+        self.batch = pyglet.graphics.Batch()
+        self.background = pyglet.graphics.OrderedGroup(0)
+        self.foreground = pyglet.graphics.OrderedGroup(1)
+        self.label = pyglet.text.Label(
+            '', font_name='Courier New', font_size=11, x=10,
+            y=window.height-70, width=420, multiline=True,
+            color=(255, 255, 255, 255), anchor_y='top', batch=self.batch,
+            group=self.foreground)
+        self.bins = 17
+        self.bar_width = 16
+        self.graph_height = 80
+        self.panel = self.batch.add(
+            4, pyglet.gl.GL_QUADS, self.background,
+            ('v2f', (0, 0)*4), ('c3B', (30, 30, 30)*4))
+        self.bars = self.batch.add(
+            4*self.bins, pyglet.gl.GL_QUADS, self.foreground,
+            ('v2f', (0, 0)*4*self.bins), ('c3B', (120, 220, 120)*4*self.bins))
+
+    def toggle(self):
+        self.visible = not self.visible
+        self.frames = 0
+
+    def update_text(self):
+        lines = []
+        stats = self.profiler.stats()
+        if 'frame' in stats:
+            mean = stats['frame'][0]
+            lines.append('{:.1f} fps (F3 hide, F4 dump)'.format(
+                1000/mean if mean else 0))
+        lines.append('{:<12}{:>8}{:>8}{:>8}'.format('ms', 'mean', 'p95', 'max'))
+        for name, (mean, p50, p95, most) in stats.items():
+            lines.append('{:<12}{:>8.2f}{:>8.2f}{:>8.2f}'.format(
+                name, mean, p95, most))
+        lines.extend('{:<12}{:>8}'.format(name, value)
+                     for name, value in self.profiler.counters.items())
+        lines.append('frame time histogram, 2 ms bins')
+        self.label.text = '\n'.join(lines)
+
+        counts = self.profiler.histogram(bins=self.bins)
+        most = max(max(counts), 1)
+        top = self.label.y-self.label.content_height-10
+        bottom = top-self.graph_height
+        vertices = []
+        for i, count in enumerate(counts):
+            x = 10+i*self.bar_width
+            height = self.graph_height*count/most
+            vertices.extend((x, bottom, x+self.bar_width-2, bottom,
+                             x+self.bar_width-2, bottom+height, x, bottom+height))
+        self.bars.vertices = vertices
+        self.panel.vertices = (0, bottom-10, 440, bottom-10,
+                               440, self.label.y+10, 0, self.label.y+10)
+
+    def draw(self):
+        if not self.visible:
+            return
+        if self.frames % self.refresh == 0:
+            self.update_text()
+        self.frames += 1
+        self.batch.draw()
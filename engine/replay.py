@@ -0,0 +1,92 @@
+import json
+import zlib
+
+from pyglet.window import key
+
+# input recording and replay. the game loop runs on a fixed timestep, so a
+# run is reproduced exactly by its mode, the mode's kwargs (the level id)
+# and the input events with the tick they arrived before. replays are
+# stored as zlib compressed json, a few kilobytes for a full run
+
+RECORDED_EVENTS = ('on_key_press', 'on_key_release', 'on_text',
+                   'on_mouse_press', 'on_mouse_release')
+# leave the mode and the profiler keys, let through while a replay plays
+WINDOW_KEYS = (key.ESCAPE, key.F3, key.F4)
+
+
+class Replay(object):
+    version = 1
+
+    def __init__(self, mode, kwargs=None, events=None, frames=0, tick_rate=60,
+                 substeps=1):
+        self.mode = mode
+        self.kwargs = kwargs or dict()
+        self.events = events or [] # [frame, event type, *args]
+        self.frames = frames
+        self.tick_rate = tick_rate
+        self.substeps = substeps
+
+    def dumps(self):
+        data = dict(version=self.version, mode=self.mode, kwargs=self.kwargs,
+                    events=self.events, frames=self.frames,
+                    tick_rate=self.tick_rate, substeps=self.substeps)
+        return zlib.compress(json.dumps(data, separators=(',', ':')).encode())
+
+    @classmethod
+    def loads(cls, data):
+        data = json.loads(zlib.decompress(data).decode())
+        if data.pop('version') != cls.version:
+            raise ValueError('unsupported replay version')
+        return cls(**data)
+
+    def save(self, filename):
+        with open(filename, 'wb') as replay_file:
+            replay_file.write(self.dumps())
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename, 'rb') as replay_file:
+            return cls.loads(replay_file.read())
+
+
+class InputRecorder(object):
+    # started by the game loop when a recorded mode is created
+    def __init__(self, window, mode):
+        self.replay = Replay(mode.id, dict(level_id=mode.level_id),
+                             tick_rate=window.tick_rate,
+                             substeps=window.substeps)
+
+    def record(self, frame, event_type, args):
+        if event_type in RECORDED_EVENTS:
+            self.replay.events.append([frame, event_type, *args])
+
+    def finish(self, frame):
+        self.replay.frames = frame
+        return self.replay
+
+
+class InputReplayer(object):
+    # feeds a replay's events to the window before the tick they were
+    # recorded at. live input events are ignored while it plays, except the
+    # window keys. the game loop drops the replayer after its last event
+    def __init__(self, window, replay):
+        self.window = window
+        self.replay = replay
+        self.next_event = 0
+
+    @property
+    def finished(self):
+        return self.next_event >= len(self.replay.events)
+
+    def accepts(self, event_type, *args):
+        if self.finished or event_type not in RECORDED_EVENTS:
+            return True
+        return (event_type in ('on_key_press', 'on_key_release') and
+                args[0] in WINDOW_KEYS)
+
+    def update(self, frame):
+        events = self.replay.events
+        while self.next_event < len(events) and events[self.next_event][0] <= frame:
+            frame_, event_type, *args = events[self.next_event]
+            self.next_event += 1
+            self.window.dispatch_replayed_event(event_type, *args)
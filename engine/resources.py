@@ -1,142 +1,217 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import pyglet
 
-print('Loading resources')
+# resources are loaded lazily: the module attributes below (tank_body_img,
+# engine_sfx, parallax_bgs[i], ...) are loaded on first use. game modes list
+# what they use in a manifest, which is loaded when the mode is created, and
+# prefetch decodes files on a background thread ahead of that. only the
+# upload into gl textures has to happen on the main thread
 
 def center_image(image):
     """Sets an image's anchor point to its center"""
     image.anchor_x = image.width / 2
     image.anchor_y = image.height / 2
 
+class AtlasLoader(pyglet.resource.Loader):
+    # pyglet packs small images into atlases already, but splits them into
+    # bins by height, so sprites drawn in one group ended up on different
+    # textures. here every image up to max_size shares one bin of atlases,
+    # all sprite images fit a single 2048x2048 texture. bigger images (the
+    # parallax layers) keep their own textures
+    def __init__(self, path, atlas_size=2048, max_size=1024):
+        super().__init__(path)
+        self.atlas_size = atlas_size
+        self.max_size = max_size
+        self.texture_bin = None
+        self.decoded = dict() # file name: future of prefetched image data
+
+    def _get_texture_atlas_bin(self, width, height):
+        if width > self.max_size or height > self.max_size:
+            return None
+        if self.texture_bin is None:
+            self.texture_bin = pyglet.image.atlas.TextureBin(
+                self.atlas_size, self.atlas_size)
+        return self.texture_bin
+
+    def _alloc_image(self, name, atlas=True):
+        # same as pyglet's, but takes the image data prefetch decoded
+        future = self.decoded.pop(name, None)
+        img = future.result() if future else self.decode(name)
+        if not atlas:
+            return img.get_texture(True)
+        texture_bin = self._get_texture_atlas_bin(img.width, img.height)
+        if texture_bin is None:
+            return img.get_texture(True)
+        return texture_bin.add(img)
+
+    def decode(self, name):
+        # file reading and decoding only, safe off the main thread
+        image_file = self.file(name)
+        try:
+            return pyglet.image.load(name, file=image_file)
+        finally:
+            image_file.close()
+
+class ParallaxSets(object):
+    # parallax_bgs[i] is the tuple of layer images of background set i,
+    # loaded on first use
+    def __init__(self, layer_counts):
+        self.layer_counts = layer_counts
+        self.sets = dict()
+
+    def files(self, index):
+        return ['{}layer_{}.png'.format(index, layer)
+                for layer in range(self.layer_counts[index])]
+
+    def __len__(self):
+        return len(self.layer_counts)
+
+    def __getitem__(self, index):
+        if index not in self.sets:
+            self.sets[index] = tuple(loader.image(name)
+                                     for name in self.files(index))
+        return self.sets[index]
+
 # Tell pyglet where to find the resources
 pyglet.resource.path = ['./resources', './resources/backgrounds']
 pyglet.resource.reindex()
-
-images = list()
-
-# Load the three main resources and get them to draw centered
-tank_body_img = pyglet.resource.image('tank_body.png')
-images.append(tank_body_img)
-
-tank_head_img = pyglet.resource.image('tank_head.png')
-images.append(tank_head_img)
-
-boxlife_img = pyglet.resource.image('boxlife.png')
-images.append(boxlife_img)
-
-boxlife_dead_img = pyglet.resource.image('boxlife_dead.png')
-images.append(boxlife_dead_img)
-
-wheel_img = pyglet.resource.image('wheel.png')
-images.append(wheel_img)
-
-thread_img = pyglet.resource.image('thread.png')
-images.append(thread_img)
-
-motorbike_chassis_img = pyglet.resource.image('motorbike_chassis.png')
-images.append(motorbike_chassis_img)
-
-mb_wheel_img = pyglet.resource.image('mb_wheel.png')
-images.append(mb_wheel_img)
-
-mb_holder_img = pyglet.resource.image('mb_holder.png')
-images.append(mb_holder_img)
-
-vbv_chassis_img = pyglet.resource.image('vbv_chassis.png')
-images.append(vbv_chassis_img)
-
-vbv_wheels_img = pyglet.resource.image('vbv_wheels.png')
-images.append(vbv_wheels_img)
-
-vbv_platform_img = pyglet.resource.image('vbv_platform.png')
-images.append(vbv_platform_img)
-
-vb_net_img = pyglet.resource.image('vb_net.png')
-images.append(vb_net_img)
-
-vb_ball_img = pyglet.resource.image('vb_ball.png')
-images.append(vb_ball_img)
-
-game1_button_img = pyglet.resource.image('game1.png')
-images.append(game1_button_img)
-
-game1_button_hover_img = pyglet.resource.image('game1_hover.png')
-images.append(game1_button_hover_img)
-
-game2_button_img = pyglet.resource.image('game2.png')
-images.append(game2_button_img)
-
-game2_button_hover_img = pyglet.resource.image('game2_hover.png')
-images.append(game2_button_hover_img)
-
-game3_button_img = pyglet.resource.image('game3.png')
-images.append(game3_button_img)
-
-game3_button_hover_img = pyglet.resource.image('game3_hover.png')
-images.append(game3_button_hover_img)
-
-game1_hs_button_img = pyglet.resource.image('game1_hs.png')
-images.append(game1_hs_button_img)
-
-game1_hs_button_hover_img = pyglet.resource.image('game1_hs_hover.png')
-images.append(game1_hs_button_hover_img)
-
-game2_hs_button_img = pyglet.resource.image('game2_hs.png')
-images.append(game2_hs_button_img)
-
-game2_hs_button_hover_img = pyglet.resource.image('game2_hs_hover.png')
-images.append(game2_hs_button_hover_img)
-
-menu_button_img = pyglet.resource.image('menu.png')
-images.append(menu_button_img)
-
-gravity_button_img = pyglet.resource.image('gravity.png')
-images.append(gravity_button_img)
-
-fullscreen_button_img = pyglet.resource.image('fullscreen.png')
-images.append(fullscreen_button_img)
-
-restart_button_img = pyglet.resource.image('restart_button.png')
-images.append(restart_button_img)
-
-enter_button_img = pyglet.resource.image('enter_button.png')
-images.append(enter_button_img)
-
-enter_button_hover_img = pyglet.resource.image('enter_button_hover.png')
-images.append(enter_button_hover_img)
-
-circle_meter_img = pyglet.resource.image('circle_meter.png')
-images.append(circle_meter_img)
-
-pointer_img = pyglet.resource.image('pointer.png')
-images.append(pointer_img)
-
-finishflag_img = pyglet.resource.image('finishflag.png')
-images.append(finishflag_img)
-
-goal_meter_img = pyglet.resource.image('goal_meter.png')
-images.append(goal_meter_img)
-
-bg_goal_meter_img = pyglet.resource.image('bg_goal_meter.png')
-images.append(bg_goal_meter_img)
-
-background_img = pyglet.resource.image('background.png')
-images.append(background_img)
-
-for image in images:
+loader = AtlasLoader(pyglet.resource.path)
+loader.reindex() # before the prefetch thread reads the index
+
+# images are drawn centered
+IMAGES = dict(
+    tank_body_img='tank_body.png',
+    tank_head_img='tank_head.png',
+    boxlife_img='boxlife.png',
+    boxlife_dead_img='boxlife_dead.png',
+    wheel_img='wheel.png',
+    thread_img='thread.png',
+    motorbike_chassis_img='motorbike_chassis.png',
+    mb_wheel_img='mb_wheel.png',
+    mb_holder_img='mb_holder.png',
+    vbv_chassis_img='vbv_chassis.png',
+    vbv_wheels_img='vbv_wheels.png',
+    vbv_platform_img='vbv_platform.png',
+    vb_net_img='vb_net.png',
+    vb_ball_img='vb_ball.png',
+    game1_button_img='game1.png',
+    game1_button_hover_img='game1_hover.png',
+    game2_button_img='game2.png',
+    game2_button_hover_img='game2_hover.png',
+    game3_button_img='game3.png',
+    game3_button_hover_img='game3_hover.png',
+    game1_hs_button_img='game1_hs.png',
+    game1_hs_button_hover_img='game1_hs_hover.png',
+    game2_hs_button_img='game2_hs.png',
+    game2_hs_button_hover_img='game2_hs_hover.png',
+    menu_button_img='menu.png',
+    gravity_button_img='gravity.png',
+    fullscreen_button_img='fullscreen.png',
+    restart_button_img='restart_button.png',
+    enter_button_img='enter_button.png',
+    enter_button_hover_img='enter_button_hover.png',
+    circle_meter_img='circle_meter.png',
+    pointer_img='pointer.png',
+    finishflag_img='finishflag.png',
+    goal_meter_img='goal_meter.png',
+    bg_goal_meter_img='bg_goal_meter.png',
+    background_img='background.png',
+)
+
+SOUNDS = dict(
+    engine_sfx='./resources/engine_sfx.wav',
+)
+
+# streamed from disk, the first file found that decodes is used. ogg needs
+# pyglet's avbin decoder, the wav is read by pyglet itself
+MUSIC = dict(
+    bg_music=('./resources/bg_music.ogg', './resources/bg_music.wav'),
+)
+
+parallax_bgs = ParallaxSets((3, 2, 2, 2, 3, 4))
+
+# resource names grouped by the objects using them, for mode manifests
+TANK = ('tank_body_img', 'tank_head_img', 'boxlife_img', 'boxlife_dead_img',
+        'wheel_img', 'thread_img', 'engine_sfx')
+MOTORBIKE = ('motorbike_chassis_img', 'mb_wheel_img', 'mb_holder_img',
+             'engine_sfx')
+VOLLEYBALL = ('vbv_chassis_img', 'vbv_wheels_img', 'vbv_platform_img',
+              'vb_net_img', 'vb_ball_img', 'engine_sfx')
+METERS = ('circle_meter_img', 'pointer_img')
+GOAL_METER = ('goal_meter_img', 'bg_goal_meter_img')
+
+prefetcher = ThreadPoolExecutor(1)
+prefetched_sounds = dict() # name: future
+prefetched_parallax = None # index of the set being decoded
+
+def load_image(name):
+    image = loader.image(IMAGES[name])
     center_image(image)
-
-# load backgrounds
-parallax_bgs = list()
-layer_counts = (3, 2, 2, 2, 3, 4)
-for bg_i, layer_count in enumerate(layer_counts):
-    bg_set = list()
-    for layer_i in range(layer_count):
-        bg_set.append(pyglet.resource.image('{}layer_{}.png'.format(bg_i, layer_i)))
-    parallax_bgs.append(tuple(bg_set))
-parallax_bgs = tuple(parallax_bgs)
-
-# Load sfx without streaming
-engine_sfx = pyglet.media.load('./resources/engine_sfx.wav', streaming=False)
-bg_music = pyglet.media.load('./resources/bg_music.wav', streaming=False)
-
-print('Resource loading successful')
+    return image
+
+def load_sound(filename):
+    # decoded completely, these are short and played in loops
+    return pyglet.media.load(filename, streaming=False)
+
+def load_music(filenames):
+    # a streaming source keeps only the buffers the audio driver has queued
+    # in memory instead of the whole decoded track. None if no file works
+    for filename in filenames:
+        if not os.path.exists(filename):
+            continue
+        try:
+            return pyglet.media.load(filename, streaming=True)
+        except pyglet.media.MediaException as error:
+            print('cannot play {}: {}'.format(filename, error))
+    return None
+
+def __getattr__(name):
+    # first use of a resource, later uses find it in the module globals
+    if name in IMAGES:
+        value = load_image(name)
+    elif name in SOUNDS:
+        future = prefetched_sounds.pop(name, None)
+        value = future.result() if future else load_sound(SOUNDS[name])
+    elif name in MUSIC:
+        value = load_music(MUSIC[name])
+    else:
+        raise AttributeError('no resource named {}'.format(name))
+    globals()[name] = value
+    return value
+
+def load(names):
+    # loads now what isn't loaded yet
+    for name in names:
+        if name not in globals():
+            __getattr__(name)
+
+def prefetch(names):
+    # decodes on the background thread what isn't loaded or queued yet
+    loaded = globals()
+    for name in names:
+        if name in loaded:
+            continue
+        if name in IMAGES:
+            filename = IMAGES[name]
+            if filename not in loader.decoded:
+                loader.decoded[filename] = prefetcher.submit(
+                    loader.decode, filename)
+        elif name in SOUNDS and name not in prefetched_sounds:
+            prefetched_sounds[name] = prefetcher.submit(
+                load_sound, SOUNDS[name])
+
+def prefetch_parallax(index):
+    # the layers are big, only the set picked last is kept decoded
+    global prefetched_parallax
+    if index in parallax_bgs.sets or index == prefetched_parallax:
+        return
+    if prefetched_parallax is not None:
+        for filename in parallax_bgs.files(prefetched_parallax):
+            future = loader.decoded.pop(filename, None)
+            if future:
+                future.cancel()
+    prefetched_parallax = index
+    for filename in parallax_bgs.files(index):
+        loader.decoded[filename] = prefetcher.submit(loader.decode, filename)
@@ -1,37 +1,135 @@
+from math import ceil
+
 import pyglet
+from pyglet.gl import (glPushAttrib, glPopAttrib, glEnable, glClipPlane,
+                       glPushMatrix, glPopMatrix, glTranslatef, GLdouble,
+                       GL_ENABLE_BIT, GL_CLIP_PLANE0, GL_CLIP_PLANE1)
+
+
+class ScrollGroup(pyglet.graphics.Group):
+    # clips the rows to the box's top and bottom like pyglet's scrollable
+    # layouts and moves them up by the scrolled distance, scrolling changes
+    # no vertices
+    def __init__(self, bottom, top, parent=None):
+        super().__init__(parent)
+        self.top_plane = (GLdouble * 4)(0, -1, 0, top)
+        self.bottom_plane = (GLdouble * 4)(0, 1, 0, -bottom)
+        self.offset = 0
+
+    def set_state(self):
+        glPushAttrib(GL_ENABLE_BIT)
+        glEnable(GL_CLIP_PLANE0)
+        glEnable(GL_CLIP_PLANE1)
+        glClipPlane(GL_CLIP_PLANE0, self.top_plane)
+        glClipPlane(GL_CLIP_PLANE1, self.bottom_plane)
+        glPushMatrix()
+        glTranslatef(0, self.offset, 0)
 
+    def unset_state(self):
+        glPopMatrix()
+        glPopAttrib()
 
-class ScrollingText(pyglet.text.layout.ScrollableTextLayout):
-    def __init__(self, batch, position, width, height, text='', 
+
+class ScrollingText(object):
+    # one line of text per row, scrolled down and back to the top on its own.
+    # only the rows in view (and margin rows above and below) have a text
+    # layout, the layouts are handed to the next rows as they scroll out, so
+    # layout time and glyph memory don't grow with the number of lines
+    def __init__(self, batch, position, width, height, text='',
                  align='left', timeout=60*3, font_size=20, scroll_speed=1,
-                 group=None):
-        document = pyglet.text.document.UnformattedDocument(text)
-        document.set_style(0, len(document.text), dict(
-            font_size=font_size,
-            color=(0, 0, 0, 255),
-            align=align
-        ))
-        super().__init__(document, width, height, multiline=True, 
-                         batch=batch, group=group)
+                 group=None, margin=1):
+        self.batch = batch
         self.x, self.y = position
-        self.view_y = 0
+        self.width = width
+        self.height = height
         self.time = 0
         self.scroll_speed = scroll_speed
         self.timeout = timeout
+        self.margin = margin
+        self.style = dict(font_size=font_size, color=(0, 0, 0, 255))
+        font = pyglet.font.load(None, font_size)
+        self.line_height = font.ascent - font.descent
+
+        self.scroll_group = ScrollGroup(self.y, self.y + height, group)
+        if align == 'right':
+            self.row_x = self.x + width
+        elif align == 'center':
+            self.row_x = self.x + width / 2
+        else:
+            self.row_x = self.x
+        self.align = align
+        # every row that can be partly in view, plus the margins
+        row_count = ceil(height / self.line_height) + 1 + 2*margin
+        self.rows = [self.create_row() for row in range(row_count)]
+        self.lines = []
+        self.first_line = None # first line with a layout
+        self._view_y = 0
 
         pad = 5
         self.background = batch.add_indexed(
             4, pyglet.gl.GL_TRIANGLES, group,
             [0, 1, 3, 1, 2, 3],
-            ('v2f', (self.x-pad, self.y-pad, 
-                     self.x-pad, self.y+height+pad, 
+            ('v2f', (self.x-pad, self.y-pad,
+                     self.x-pad, self.y+height+pad,
                      self.x+width+pad, self.y+height+pad,
                      self.x+width+pad, self.y-pad)),
             ('c3B', (255, 255, 255)*4)
         )
-        
+        self.update_text(text)
+
+    def create_row(self):
+        document = pyglet.text.document.UnformattedDocument('')
+        document.set_style(0, 0, self.style)
+        layout = pyglet.text.layout.TextLayout(
+            document, batch=self.batch, group=self.scroll_group)
+        layout.begin_update()
+        layout.anchor_x = self.align
+        layout.anchor_y = 'top'
+        layout.x = self.row_x
+        layout.end_update()
+        layout.line = None # index of the line it shows
+        return layout
+
+    @property
+    def content_height(self):
+        return len(self.lines) * self.line_height
+
+    @property
+    def view_y(self):
+        # 0 shows the first line at the top, scrolling down makes it negative
+        return self._view_y
+
+    @view_y.setter
+    def view_y(self, view_y):
+        self._view_y = min(0, max(self.height - self.content_height, view_y))
+        self.scroll_group.offset = -self._view_y
+        self.place_rows()
+
+    def place_rows(self):
+        # a layout only changes when the line it shows scrolls out of range
+        first = max(0, int(-self._view_y // self.line_height) - self.margin)
+        if first == self.first_line:
+            return
+        self.first_line = first
+        for line in range(first, first + len(self.rows)):
+            layout = self.rows[line % len(self.rows)]
+            if layout.line == line:
+                continue
+            layout.line = line
+            layout.begin_update()
+            layout.document.text = (self.lines[line]
+                                    if line < len(self.lines) else '')
+            layout.y = self.y + self.height - line*self.line_height
+            layout.end_update()
+
     def update_text(self, text):
-        self.document.text = text
+        self.lines = text.split('\n')
+        if self.lines[-1] == '':
+            self.lines.pop() # text ending in a newline
+        for layout in self.rows:
+            layout.line = None
+        self.first_line = None
+        self.view_y = self._view_y
 
     def update(self):
         if self.time < self.timeout:
@@ -1,10 +1,86 @@
 import pyglet
 
+from . import resources
 
 class SoundLoop(pyglet.media.Player):
+    # plays a sound over and over. the source group seeks back to the start
+    # in the same read that hits the end, so there is no gap between loops.
+    # static sources can be shared by many loops, a streaming source is
+    # decoded as it plays and can only be looped by one
     def __init__(self, sound):
         super().__init__()
         looper = pyglet.media.SourceGroup(sound.audio_format, None)
         looper.loop = True
         looper.queue(sound)
         self.queue(looper)
+
+class Voice(object):
+    # a vehicle's handle on a pooled player. pitch changes smaller than the
+    # pool's threshold are not sent to the player. a stolen or released
+    # voice has no player and ignores everything
+    def __init__(self, pool, player):
+        self.pool = pool
+        self.player = player
+        self.sent_pitch = None
+
+    @property
+    def volume(self):
+        return self.player.volume if self.player else 0
+
+    @volume.setter
+    def volume(self, volume):
+        if self.player:
+            self.player.volume = volume
+
+    @property
+    def pitch(self):
+        return self.sent_pitch
+
+    @pitch.setter
+    def pitch(self, pitch):
+        if self.player is None:
+            return
+        if (self.sent_pitch is None or
+                abs(pitch - self.sent_pitch) > self.pool.pitch_threshold):
+            self.player.pitch = pitch
+            self.sent_pitch = pitch
+
+    def release(self):
+        self.pool.release(self)
+
+class VoicePool(object):
+    # looping players of one sound, handed out to vehicles and paused for
+    # reuse when released, instead of a new player per vehicle. at most
+    # limit voices play at once, asking for another steals the oldest.
+    # the game loop releases all voices when it replaces a mode
+    def __init__(self, sound_name, limit=4, pitch_threshold=0.01):
+        self.sound_name = sound_name
+        self.limit = limit
+        self.pitch_threshold = pitch_threshold
+        self.players = [] # paused, ready to be handed out
+        self.voices = [] # playing, oldest first
+
+    def acquire(self):
+        if len(self.voices) >= self.limit:
+            self.release(self.voices[0])
+        if self.players:
+            player = self.players.pop()
+        else:
+            player = SoundLoop(getattr(resources, self.sound_name))
+        player.volume = 1
+        player.play()
+        voice = Voice(self, player)
+        self.voices.append(voice)
+        return voice
+
+    def release(self, voice):
+        if voice.player is None:
+            return
+        voice.player.pause()
+        self.players.append(voice.player)
+        self.voices.remove(voice)
+        voice.player = None
+
+    def release_all(self):
+        for voice in list(self.voices):
+            self.release(voice)
@@ -1,14 +1,28 @@
-from random import gauss, randint
-from math import sin, cos, pi
+from random import Random
+from math import cos, pi
 
+import numpy
 import pyglet
 import pymunk
 
+from engine.level import make_random
+
+
+def generate_heights(interval, mid_height, height_change, end_coordinate,
+                     seed=None):
+    x = numpy.arange(0, end_coordinate+interval, interval, dtype=float)
+    randomness = numpy.random.RandomState(seed).normal(0, height_change, len(x))
+    increasing_randomness = 70-60*numpy.sin((x/700)-(pi/2))*randomness
+    y = mid_height-60*numpy.sin(x/200) + increasing_randomness
+    return x, y
 
 class Terrain(object):
+    # shapes and primitives are streamed in chunks of chunk_segments segments
+    # around the camera, only the height profile is kept for the whole course.
+    # primitives are in world coordinates, draw them in a CameraGroup
     def __init__(self, batch, space, window, interval=100, mid_height=360, 
                  height_change=0.65, end_coordinate=30000, color_set='green',
-                 group=None):
+                 chunk_segments=16, seed=None, heights=None, group=None):
         if color_set == 'green':
             color1 = (78, 51, 0)*2 + (0, 145, 48)*2
             color2 = (78, 51, 0)*2 + (0, 78, 26)*2
@@ -17,56 +31,116 @@ class Terrain(object):
             color2 = (78, 51, 0)*2 + (80, 80, 80)*2
         # color1 = (0, 145, 48)*2 + (78, 51, 0)*2
         # color2 = (0, 78, 26)*2 + (78, 51, 0)*2
+        self.colors = numpy.array((color1, color2))
         self.batch = batch
         self.space = space
         self.window = window
         self.interval = interval
+        self.group = group
+        self.chunk_segments = chunk_segments
+        self.chunk_width = chunk_segments*interval
         self.terrain_body = pymunk.Body(body_type=pymunk.Body.STATIC)
         self.terrain_body.position = (0, 0)
-        self.terrain_shapes = []
-        self.terrain_primitives = []
+        self.chunks = dict() # chunk index: (shapes, primitive)
 
-        coords = []
-        for i in range(0, end_coordinate+interval, interval):
-            increasing_randomness = 70-60*sin((i/700)-(pi/2))*\
-                                    gauss(0, height_change)
-            x = i
-            y = mid_height-60*sin(i/200) + increasing_randomness
-            coords.append((x, y))
+        if heights is None: # else a precomputed (x, y) profile, see LevelCache
+            if isinstance(seed, Random):
+                seed = seed.getrandbits(32)
+            heights = generate_heights(interval, mid_height, height_change,
+                                       end_coordinate, seed)
+        self.x, self.y = heights
+        self.segment_count = len(self.x)-1
+        self.chunk_count = -(-self.segment_count//chunk_segments)
 
-        for i, coord in enumerate(list(zip(coords, coords[1:]))):
-            coord1, coord2 = coord
-            verts = (coord1, coord2, (coord2[0], 0), (coord1[0]-25, 0))
+        self.space.add(self.terrain_body)
+        self.stream()
+
+    def get_physical_object(self):
+        terrain_shapes = []
+        for shapes, primitive in self.chunks.values():
+            terrain_shapes.extend(shapes)
+        return [self.terrain_body] + terrain_shapes
+
+    def chunk_range(self, x_offset=0):
+        # keep one window width of terrain loaded on both sides of the screen
+        margin = self.window.width
+        first = max(int((x_offset-margin)//self.chunk_width), 0)
+        last = min(int((x_offset+self.window.width+margin)//self.chunk_width),
+                   self.chunk_count-1)
+        return first, last
+
+    def stream(self, x_offset=0):
+        first, last = self.chunk_range(x_offset)
+        for index in list(self.chunks):
+            if not first <= index <= last:
+                self.__retire_chunk(index)
+        for index in range(first, last+1):
+            if index not in self.chunks:
+                self.__build_chunk(index)
+
+    def __build_chunk(self, index):
+        start = index*self.chunk_segments
+        end = min(start+self.chunk_segments, self.segment_count)
+        count = end-start
+        # one quad per segment, same vertex order as the terrain shape's
+        # get_vertices(): bottom left, bottom right, top right, top left
+        quads = numpy.zeros((count, 4, 2))
+        quads[:, 0, 0] = self.x[start:end]-25
+        quads[:, 1, 0] = self.x[start+1:end+1]
+        quads[:, 2, 0] = self.x[start+1:end+1]
+        quads[:, 2, 1] = self.y[start+1:end+1]
+        quads[:, 3, 0] = self.x[start:end]
+        quads[:, 3, 1] = self.y[start:end]
+
+        shapes = []
+        for verts in quads.tolist():
             terrain_shape = pymunk.Poly(self.terrain_body, verts)
             terrain_shape.filter = pymunk.ShapeFilter(categories=0b0001000, 
                                                       mask=0b1110111)
             terrain_shape.elasticity = 0.4
             terrain_shape.friction = 0.85
-            self.terrain_shapes.append(terrain_shape)
+            shapes.append(terrain_shape)
+        self.space.add(*shapes)
 
-            self.terrain_primitives.append(self.batch.add_indexed(
-                4, pyglet.gl.GL_TRIANGLES, group,
-                [0, 1, 3, 1, 2, 3],
-                ('v2f', (*coord1, *coord2, coord2[0], 0, coord1[0], 0)),
-                ('c3B', color1 if i%2 == 0 else color2)
-            ))
-        self.space.add(*self.get_physical_object())
+        indices = numpy.array((0, 1, 3, 1, 2, 3)) + 4*numpy.arange(count)[:, None]
+        colors = self.colors[numpy.arange(start, end)%2]
+        primitive = self.batch.add_indexed(
+            4*count, pyglet.gl.GL_TRIANGLES, self.group,
+            indices.ravel().tolist(),
+            ('v2f', quads.ravel().tolist()),
+            ('c3B', colors.ravel().tolist())
+        )
+        self.chunks[index] = (shapes, primitive)
 
-    def get_physical_object(self):
-        return [self.terrain_body] + self.terrain_shapes
+    def __retire_chunk(self, index):
+        shapes, primitive = self.chunks.pop(index)
+        self.space.remove(*shapes)
+        primitive.delete()
 
-    def update(self, x_offset=0, update_all=False):
-        for i in range(len(self.terrain_shapes)):
-            vertices = self.terrain_shapes[i].get_vertices()
-            if -self.interval-60 < vertices[0][0]-x_offset < self.window.width+self.interval+60 or update_all:
-                pyglet_coords = []
-                for v in vertices:
-                    x, y = v
-                    pyglet_coords.extend((x-x_offset, y))
-                self.terrain_primitives[i].vertices = pyglet_coords
+    def reset(self, space):
+        # moves the course to a new space for a restart. the chunks at the
+        # start that are still loaded are added back instead of rebuilt, in
+        # the order stream adds them
+        self.space = space
+        self.space.add(self.terrain_body)
+        first, last = self.chunk_range()
+        chunks, self.chunks = self.chunks, dict()
+        for index, (shapes, primitive) in chunks.items():
+            if not first <= index <= last:
+                primitive.delete()
+        for index in range(first, last+1):
+            if index in chunks:
+                self.space.add(*chunks[index][0])
+                self.chunks[index] = chunks[index]
+            else:
+                self.__build_chunk(index)
+
+    def update(self, x_offset=0):
+        self.stream(x_offset)
 
 class SymmetricTerrain(object):
-    def __init__(self, batch, space, window, color_set='gray', group=None):
+    def __init__(self, batch, space, window, color_set='gray', seed=None,
+                 group=None):
         if color_set == 'green':
             color1 = (78, 51, 0)*2 + (0, 145, 48)*2
             color2 = (78, 51, 0)*2 + (0, 78, 26)*2
@@ -84,8 +158,9 @@ class SymmetricTerrain(object):
         self.terrain_primitives = []
         interval = self.window.width//2
 
-        height_change = randint(-15, 15)
-        period = randint(100, 200)
+        rng = make_random(seed)
+        height_change = rng.randint(-15, 15)
+        period = rng.randint(100, 200)
         coords = []
         for i in range(-width//2, width//2+interval, interval):
             x, y = i, 135 + height_change*cos(i/period)
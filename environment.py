@@ -0,0 +1,262 @@
+"""Batch driving environments for training bots on Game1 and Game2 courses.
+
+    environments = BatchEnvironment(16, mode="hillclimb", seed=0)
+    observations = environments.reset()
+    while training:
+        actions = policy(observations)  # COAST, FORWARD or REVERSE each
+        observations, rewards, dones, infos = environments.step(actions)
+    environments.close()
+
+Every environment is a headless game run of its own pymunk space, driven by
+the same key events a player sends. Environments are spread over worker
+processes, or stepped in this process with workers=0.
+"""
+import contextlib
+import io
+import multiprocessing
+import random
+
+import numpy
+
+import engine.headless as headless
+
+headless.enable()
+
+from pyglet.window import key  # noqa: E402
+
+import game  # noqa: E402
+
+GAMES = {game.Game1.name: game.Game1, game.Game2.name: game.Game2}
+COAST, FORWARD, REVERSE = 0, 1, 2
+ACTION_KEYS = {FORWARD: key.D, REVERSE: key.A}
+# chassis x, y, x velocity, y velocity, angle, angular velocity,
+# rear wheel angular velocity, lives, course progress
+OBSERVATION_SIZE = 9
+
+
+class DrivingEnvironment(object):
+    def __init__(
+        self,
+        mode=game.Game1.name,
+        frame_skip=4,
+        max_frames=60 * 180,
+        seed=None,
+        level_cache=False,
+    ):
+        self.mode = GAMES[mode]
+        self.frame_skip = frame_skip  # ticks per step, the action is held
+        self.max_frames = max_frames
+        # whether the levels of the resets are written to the level cache.
+        # each reset picks a new course, millions of episodes would fill it
+        self.level_cache = level_cache
+        self.random = random.Random(seed)  # level ids of the resets
+        self.window = None
+        self.action = COAST
+        self.frames = 0
+
+    @property
+    def state(self):
+        return self.window.activated_mode
+
+    @property
+    def vehicle(self):
+        return getattr(self.state, "tank1", None) or self.state.motorbike
+
+    def reset(self, level_id=None):
+        if level_id is None:
+            level_id = self.random.getrandbits(32)
+        kwargs = dict(level_id=level_id, store_level=self.level_cache)
+        with contextlib.redirect_stdout(io.StringIO()):  # mode switches print
+            if self.window is None:
+                self.window = game.HeadlessWindow(mode=self.mode.id, **kwargs)
+            else:
+                self.window.switch_mode(self.mode.id, **kwargs)
+        self.action = COAST
+        self.frames = 0
+        self.last_x = self.vehicle.chassis.body.position.x
+        self.last_lives = getattr(self.vehicle, "lives", 1)
+        return self.observe()
+
+    def send_action(self, action):
+        # actions are sent as the key events of a player
+        if action == self.action:
+            return
+        if self.action != COAST:
+            self.window.dispatch_event("on_key_release", ACTION_KEYS[self.action], 0)
+        if action != COAST:
+            self.window.dispatch_event("on_key_press", ACTION_KEYS[action], 0)
+        self.action = action
+
+    def observe(self):
+        vehicle = self.vehicle
+        body = vehicle.chassis.body
+        return numpy.array(
+            (
+                body.position.x,
+                body.position.y,
+                body.velocity.x,
+                body.velocity.y,
+                body.angle,
+                body.angular_velocity,
+                vehicle.wheels[0].body.angular_velocity,
+                getattr(vehicle, "lives", 1),
+                body.position.x / self.state.end_position,
+            ),
+            dtype=numpy.float32,
+        )
+
+    def step(self, action):
+        # returns observation, reward, done and an info dict. the reward is
+        # the distance driven in hundreds of pixels minus one per life lost
+        self.send_action(int(action))
+        for frame in range(self.frame_skip):
+            self.window.tick()
+            self.frames += 1
+            if self.done():
+                break
+        x = self.vehicle.chassis.body.position.x
+        lives = getattr(self.vehicle, "lives", 1)
+        reward = (x - self.last_x) / 100 - (self.last_lives - lives)
+        self.last_x, self.last_lives = x, lives
+        info = dict(
+            level_id=self.state.level_id,
+            frames=self.frames,
+            finished=self.state.change_to == game.Endgame.id,
+            score=self.state.kwargs.get("score"),
+        )
+        return self.observe(), reward, self.done(), info
+
+    def done(self):
+        state = self.state
+        return bool(state.change_to or state.ENDGAME or self.frames >= self.max_frames)
+
+
+class EnvironmentGroup(object):
+    # the environments of one worker, stepped one after another
+    def __init__(self, seeds, auto_reset, **options):
+        self.environments = [DrivingEnvironment(seed=seed, **options) for seed in seeds]
+        self.auto_reset = auto_reset
+
+    def reset(self, level_ids):
+        return [
+            environment.reset(level_id)
+            for environment, level_id in zip(self.environments, level_ids)
+        ]
+
+    def step(self, actions):
+        results = []
+        for environment, action in zip(self.environments, actions):
+            observation, reward, done, info = environment.step(action)
+            if done and self.auto_reset:
+                info["terminal_observation"] = observation
+                observation = environment.reset()
+            results.append((observation, reward, done, info))
+        return results
+
+
+def worker(connection, seeds, auto_reset, options):
+    group = EnvironmentGroup(seeds, auto_reset, **options)
+    while True:
+        command, data = connection.recv()
+        if command == "close":
+            break
+        connection.send(getattr(group, command)(data))
+    connection.close()
+
+
+class BatchEnvironment(object):
+    def __init__(
+        self,
+        count,
+        mode=game.Game1.name,
+        frame_skip=4,
+        max_frames=60 * 180,
+        seed=None,
+        workers=None,
+        auto_reset=True,
+        level_cache=False,
+    ):
+        # workers=None starts one process per core (at most count), 0 steps
+        # everything in this process. with auto_reset a finished environment
+        # is reset by step, its last observation is in info. level_cache=True
+        # writes the courses played to the level cache
+        self.count = count
+        options = dict(
+            mode=mode,
+            frame_skip=frame_skip,
+            max_frames=max_frames,
+            level_cache=level_cache,
+        )
+        rng = random.Random(seed)
+        seeds = [rng.getrandbits(32) for environment in range(count)]
+        if workers is None:
+            workers = min(count, multiprocessing.cpu_count())
+        self.groups = []
+        self.connections = []
+        self.processes = []
+        if workers == 0:
+            self.groups.append(EnvironmentGroup(seeds, auto_reset, **options))
+            self.sizes = [count]
+            return
+        # environments are split as evenly as possible over the workers
+        self.sizes = [len(range(i, count, workers)) for i in range(workers)]
+        start = 0
+        for size in self.sizes:
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=worker,
+                args=(child, seeds[start : start + size], auto_reset, options),
+                daemon=True,
+            )
+            process.start()
+            child.close()
+            self.connections.append(parent)
+            self.processes.append(process)
+            start += size
+
+    def call(self, command, data):
+        # sends every worker its slice, then gathers all results in order
+        slices = []
+        start = 0
+        for size in self.sizes:
+            slices.append(data[start : start + size])
+            start += size
+        if self.groups:
+            return getattr(self.groups[0], command)(slices[0])
+        for connection, data_slice in zip(self.connections, slices):
+            connection.send((command, data_slice))
+        results = []
+        for connection in self.connections:
+            results.extend(connection.recv())
+        return results
+
+    def reset(self, level_ids=None):
+        # stacked (count, OBSERVATION_SIZE) observations
+        if level_ids is None:
+            level_ids = [None] * self.count
+        return numpy.stack(self.call("reset", list(level_ids)))
+
+    def step(self, actions):
+        results = self.call("step", [int(action) for action in actions])
+        observations, rewards, dones, infos = zip(*results)
+        return (
+            numpy.stack(observations),
+            numpy.array(rewards, dtype=numpy.float32),
+            numpy.array(dones),
+            list(infos),
+        )
+
+    def close(self):
+        for connection in self.connections:
+            connection.send(("close", None))
+            connection.close()
+        for process in self.processes:
+            process.join()
+        self.connections = []
+        self.processes = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -1,6 +1,9 @@
 from string import whitespace
-from random import choice, randrange
 from math import pi
+import argparse
+import atexit
+import os
+import time
 
 # third party modules
 import pyglet
@@ -9,17 +12,29 @@ import pymunk
 from pymunk.pyglet_util import DrawOptions
 
 # own modules
+import engine.headless as headless
 import engine.resources as resources
 from engine.player import Tank, MotorBike, VbVehicle
-from engine.terrain import Terrain, SymmetricTerrain
-from engine.obstacles import Obstacles
+from engine.terrain import Terrain, SymmetricTerrain, generate_heights
+from engine.obstacles import Obstacles, generate_obstacles
 from engine.button import Button
 from engine.text_input import TextInput
-from engine.hs_handling import get_highscores, add_highscore
+from engine.hs_handling import LeaderboardCache, ScoreStore, ScoreWriter
 from engine.scrolling_text import ScrollingText
+from engine.hud_text import HudText, DIGITS
 from engine.custom_sprites import GoalSprite, MeterSprite, ParallaxBG, BallIndicator
-from engine.sound_loop import SoundLoop
+from engine.sound_loop import SoundLoop, VoicePool
 from engine.physical_object import GameBall
+from engine.camera import Camera, CameraGroup
+from engine.level import (
+    LevelCache,
+    LevelPreloader,
+    level_random,
+    make_random,
+    new_level_id,
+)
+from engine.profiler import FrameProfiler, ProfilerOverlay, batch_stats
+from engine.replay import InputRecorder, InputReplayer, Replay
 
 # categories: body, wheels, tank threads/vbboundery,
 #             floor, obstacles, tank boxlives,
@@ -37,95 +52,307 @@ from engine.physical_object import GameBall
 #            COLLTYPE_VB_PLAYER2_PLATFORM = 9
 
 
-class Window(pyglet.window.Window):
+class GameLoop(object):
+    # shared by Window and HeadlessWindow: physics stepping, game mode
+    # updates and mode transitions
+    tick_rate = 60  # game mode updates per second, modes count 1/60 s a tick
+    substeps = 1  # physics steps per tick, raise for stiffer joints
+    max_ticks = 5  # ticks per frame before the game slows down instead
+    accumulator = 0.0  # real time not yet simulated
+    speed = 1.0  # game time per real time, above 1 fast forwards
+    frame = 0  # ticks since the current mode was created
+    time = 0.0  # frame / tick_rate, drives the game clock
+    record_runs = False  # save a replay of every recordable mode run
+    replay_directory = "replays"
+    recorder = None
+    replayer = None
+    last_replay = None
+
+    def tick(self):
+        if self.replayer:
+            self.replayer.update(self.frame)
+            if self.replayer.finished:
+                self.replayer = None  # live input is taken again
+        self.frame += 1
+        self.time = self.frame / self.tick_rate
+        self.clock.tick()  # game modes schedule on self.clock
+        step = 1.0 / (self.tick_rate * self.substeps)
+        with self.profiler.section("physics"):
+            for substep in range(self.substeps):
+                self.space.step(step)  # update physics               # pymunk
+        with self.profiler.section("update"):
+            self.activated_mode.update()  # update draws/camera # pyglet
+
+    def update(self, dt):
+        # fixed timestep: real time is consumed in whole ticks, the time left
+        # over places the drawn frame between the last two ticks
+        tick_time = 1.0 / self.tick_rate
+        self.accumulator = min(
+            self.accumulator + dt * self.speed, self.max_ticks * self.speed * tick_time
+        )
+        while self.accumulator >= tick_time:
+            self.accumulator -= tick_time
+            self.tick()
+            new_mode = self.activated_mode.change_to
+            if new_mode:
+                self.switch_mode(
+                    new_mode, *self.activated_mode.args, **self.activated_mode.kwargs
+                )
+                self.accumulator = 0.0
+                break
+        with self.profiler.section("interpolate"):
+            self.activated_mode.interpolate(self.accumulator / tick_time)
+
+    def dispatch_event(self, event_type, *args):
+        if self.replayer and not self.replayer.accepts(event_type, *args):
+            return False  # live input is ignored while a replay plays
+        if self.recorder:
+            self.recorder.record(self.frame, event_type, args)
+        return super().dispatch_event(event_type, *args)
+
+    def dispatch_replayed_event(self, event_type, *args):
+        # straight to the handlers, the window may queue dispatch_event
+        if self.recorder:
+            self.recorder.record(self.frame, event_type, args)
+        return pyglet.event.EventDispatcher.dispatch_event(self, event_type, *args)
+
+    def play_replay(self, replay):
+        if replay.tick_rate != self.tick_rate:
+            raise ValueError("replay was recorded at a different tick rate")
+        self.substeps = replay.substeps
+        self.switch_mode(replay.mode, **replay.kwargs)
+        self.replayer = InputReplayer(self, replay)
+
+    def save_replay(self, replay):
+        os.makedirs(self.replay_directory, exist_ok=True)
+        filename = os.path.join(
+            self.replay_directory,
+            "{}_{}_{}.replay".format(
+                modes[replay.mode].name,
+                replay.kwargs.get("level_id"),
+                time.strftime("%Y%m%d_%H%M%S"),
+            ),
+        )
+        replay.save(filename)
+        print("Replay written to", filename)
+
+    def stop_recording(self):
+        # ends the recorded run, saves and returns its replay
+        if self.recorder:
+            self.last_replay = self.recorder.finish(self.frame)
+            self.recorder = None
+            self.save_replay(self.last_replay)
+        return self.last_replay
+
+    def switch_mode(self, new_mode, *args, **kwargs):
+        print("ID: {} | args: {} | kwargs: {}".format(new_mode, args, kwargs))
+        self.stop_recording()
+        self.replayer = None
+        if new_mode == self.activated_mode.id and self.activated_mode.can_restart(
+            *args, **kwargs
+        ):
+            self.restart_mode()
+            return
+        # delete current gamestate instance, its vehicles' engine sounds are
+        # paused and handed to the next mode
+        self.engine_voices.release_all()
+        del self.activated_mode
+        # remove objects in pymunk space
+        self.space.remove(
+            *self.space.bodies, *self.space.shapes, *self.space.constraints
+        )
+        del self.space
+        self.space = pymunk.Space()
+        # delete pyglet main batch
+        del self.main_batch
+        # create fresh pyglet main batch
+        self.main_batch = self.create_batch()
+        # remove handlers from pyglet window
+        self.pop_handlers()
+        # create new gamestate instance
+        self.activated_mode = self.create_mode(new_mode, *args, **kwargs)
+
+    def restart_mode(self):
+        # the mode keeps the batch and its static objects, see
+        # GameState.restart. the space is new so the restarted run steps
+        # exactly like a freshly built one
+        self.space.remove(
+            *self.space.bodies, *self.space.shapes, *self.space.constraints
+        )
+        self.space = pymunk.Space()
+        self.pop_handlers()
+        self.reset_clock()
+        self.activated_mode.restart(self.space)
+        if self.record_runs and self.activated_mode.recordable:
+            self.recorder = InputRecorder(self, self.activated_mode)
+
+    def create_mode(self, mode_id, *args, **kwargs):
+        mode = modes[mode_id]
+        self.set_music_volume(mode.music_volume)
+        resources.load(mode.manifest)
+        self.reset_clock()
+        activated_mode = mode(self.main_batch, self.space, self, *args, **kwargs)
+        if self.record_runs and mode.recordable:
+            self.recorder = InputRecorder(self, activated_mode)
+        return activated_mode
+
+    def reset_clock(self):
+        # every mode starts at frame 0 on a fresh clock, which also drops
+        # whatever the previous mode still had scheduled
+        self.frame = 0
+        self.time = 0.0
+        self.clock = pyglet.clock.Clock(time_function=lambda: self.time)
+
+    def create_batch(self):
+        return pyglet.graphics.Batch()
+
+    def set_music_volume(self, volume):
+        pass
+
+
+class Window(GameLoop, pyglet.window.Window):
     def __init__(self, width, height, caption="", resizeable=False):
         super().__init__(width, height, caption, resizeable)
-        self.main_batch = pyglet.graphics.Batch()
+        self.profiler = FrameProfiler()
+        self.engine_voices = VoicePool("engine_sfx")  # looped by the vehicles
+        self.main_batch = self.create_batch()
         self.space = pymunk.Space()
         # self.space = pymunk.Space(threaded=True) # only for non windows os
         # self.space.threads = 4 # only for non windows os
         self.space.gravity = 0, -900
 
-        self.activated_mode = Menu(self.main_batch, self.space, self)
-        self.change_mode = None
-
-        self.options = DrawOptions()  # debugging
-        # self.options.flags = pymunk.SpaceDebugDrawOptions.DRAW_SHAPES # debugging
-        self.fps_display = pyglet.clock.ClockDisplay(color=(1, 1, 1, 1))  # debugging
-
         # bg music ############################################################
-        self.bg_music = SoundLoop(resources.bg_music)
+        # streamed, without a music file the player stays empty
+        music = resources.bg_music
+        self.bg_music = SoundLoop(music) if music else pyglet.media.Player()
         self.bg_music.play()
         #######################################################################
 
-        pyglet.clock.schedule_interval(self.update, 1 / 60.0)
+        self.activated_mode = self.create_mode(Menu.id)
+        # the other modes' resources are decoded while the menu is up
+        for mode in modes.values():
+            resources.prefetch(mode.manifest)
+
+        self.options = DrawOptions()  # debugging
+        # self.options.flags = pymunk.SpaceDebugDrawOptions.DRAW_SHAPES # debugging
+        self.profiler_overlay = ProfilerOverlay(self.profiler, self)  # F3
+
+        # drawn once per screen refresh with vsync, the simulation runs at
+        # tick_rate regardless
+        pyglet.clock.schedule(self.update)
 
     def on_draw(self):
         # self.clear()
         # self.space.debug_draw(self.options) # debugging
-        self.main_batch.draw()
-        self.fps_display.draw()  # debugging
+        with self.profiler.section("draw"):
+            self.main_batch.draw()
+        if self.profiler_overlay.visible:
+            self.count_batch_stats()
+        self.profiler_overlay.draw()
+        self.profiler.end_frame()
+
+    def count_batch_stats(self):
+        # walks the whole batch, only done while someone reads the counters
+        stats = batch_stats(self.main_batch)
+        if stats:
+            self.profiler.count("draw calls", stats[0])
+            self.profiler.count("textures", stats[1])
 
-    def update(self, dt):
-        dt = 1 / 60.0
-        self.space.step(dt)  # update physics               # pymunk
-        self.activated_mode.update()  # update draws/camera # pyglet
-        new_mode = self.activated_mode.change_to
-        if new_mode:
-            args_to_pass = self.activated_mode.args
-            kwargs_to_pass = self.activated_mode.kwargs
-            print(
-                "ID: {} | args: {} | kwargs: {}".format(
-                    new_mode, args_to_pass, kwargs_to_pass
-                )
-            )
-            # delete current gamestate instance
-            del self.activated_mode
-            # remove objects in pymunk space
-            self.space.remove(
-                *self.space.bodies, *self.space.shapes, *self.space.constraints
-            )
-            del self.space
-            self.space = pymunk.Space()
-            # delete pyglet main batch
-            del self.main_batch
-            # create fresh pyglet main batch
-            self.main_batch = pyglet.graphics.Batch()
-            # remove handlers from pyglet window
-            self.pop_handlers()
-            # create new gamestate instance
-            if new_mode == Game1.id:
-                self.bg_music.volume = 0.1
-                self.activated_mode = Game1(self.main_batch, self.space, self)
-            if new_mode == Game2.id:
-                self.bg_music.volume = 0.1
-                self.activated_mode = Game2(self.main_batch, self.space, self)
-            if new_mode == Game3.id:
-                self.bg_music.volume = 0.6
-                self.activated_mode = Game3(self.main_batch, self.space, self)
-            elif new_mode == Menu.id:
-                self.bg_music.volume = 0.6
-                self.activated_mode = Menu(self.main_batch, self.space, self)
-            elif new_mode == Endgame.id:
-                self.bg_music.volume = 0.6
-                self.activated_mode = Endgame(
-                    self.main_batch, self.space, self, *args_to_pass, **kwargs_to_pass
-                )
-            elif new_mode == HighScore.id:
-                self.bg_music.volume = 0.6
-                self.activated_mode = HighScore(
-                    self.main_batch, self.space, self, *args_to_pass, **kwargs_to_pass
-                )
+    def on_key_press(self, symbol, modifiers):
+        if symbol == key.F3:
+            self.profiler_overlay.toggle()
+        elif symbol == key.F4:
+            filename = time.strftime("frame_profile_%Y%m%d_%H%M%S.json")
+            self.count_batch_stats()
+            self.profiler.dump(filename)
+            print("Frame profile written to", filename)
+        else:
+            super().on_key_press(symbol, modifiers)
+
+    def set_music_volume(self, volume):
+        self.bg_music.volume = volume
 
     def on_mouse_press(self, x, y, button, modifier):
         print("Mouse pressed:", x, y, button, modifier)
 
 
+class HeadlessWindow(GameLoop, pyglet.event.EventDispatcher):
+    # runs a game mode against the null renderer of engine.headless, which
+    # has to be enabled before this module is imported
+    def __init__(self, width=1280, height=720, mode=None, *args, **kwargs):
+        if not headless.enabled:
+            raise RuntimeError("engine.headless.enable() was not called")
+        self.width = width
+        self.height = height
+        self.fullscreen = False
+        self.profiler = FrameProfiler()
+        self.engine_voices = VoicePool("engine_sfx")
+
+        self.main_batch = self.create_batch()
+        self.space = pymunk.Space()
+        self.space.gravity = 0, -900
+        self.activated_mode = self.create_mode(mode or Menu.id, *args, **kwargs)
+
+    def run(self, frames, stop_at_end=True):
+        # steps until the mode asks for a change, the game ends (unless
+        # stop_at_end is False) or frames run out, returns the number of
+        # frames stepped. one frame is one tick, drawn like a display
+        # refreshing at tick_rate would
+        for frame in range(frames):
+            self.tick()
+            mode = self.activated_mode
+            with self.profiler.section("interpolate"):
+                mode.interpolate(1.0)
+            self.profiler.end_frame()
+            if mode.change_to or (stop_at_end and getattr(mode, "ENDGAME", False)):
+                return frame + 1
+        return frames
+
+    def create_batch(self):
+        return headless.NullBatch()
+
+    def get_size(self):
+        return self.width, self.height
+
+    def set_fullscreen(self, fullscreen=True):
+        self.fullscreen = fullscreen
+
+
+for event_type in (
+    "on_key_press",
+    "on_key_release",
+    "on_text",
+    "on_text_motion",
+    "on_text_motion_select",
+    "on_mouse_motion",
+    "on_mouse_press",
+    "on_mouse_release",
+    "on_mouse_drag",
+):
+    HeadlessWindow.register_event_type(event_type)
+
+
 # MENU AND GAME MODES #########################################################
+level_cache = LevelCache()
+level_preloader = LevelPreloader()
+score_store = ScoreStore()
+# scores are written on a worker thread, the queue is flushed at exit
+score_writer = ScoreWriter(score_store)
+atexit.register(score_writer.close)
+
+
 class GameState(object):
     id = 0
-
-    def __init__(self, batch, space, window, mouse_hover=False, bounded=False):
+    music_volume = 0.6
+    recordable = False  # runs can be recorded and replayed, needs level_id
+    manifest = ()  # resources loaded before the mode is created
+    # generator options of modes with a generated course, see generate_level
+    terrain_options = None
+    obstacle_options = None
+
+    def __init__(
+        self, batch, space, window, mouse_hover=False, bounded=False, seed=None
+    ):
         self.COLLTYPE_DEFAULT = 0
         self.COLLTYPE_BOXLIFE = 1
         self.COLLTYPE_SENSOR = 2
@@ -140,8 +367,17 @@ class GameState(object):
         self.midground = pyglet.graphics.OrderedGroup(12)
         self.foreground = pyglet.graphics.OrderedGroup(13)
         self.front = pyglet.graphics.OrderedGroup(14)
+        # world space layers, scrolled by the camera on the gpu. their orders
+        # lie between the parallax layers (0 to 3) and the screen space ones,
+        # groups of equal order have no defined draw order
+        self.camera = Camera()
+        self.world_back = CameraGroup(5, self.camera)
+        self.world_background = CameraGroup(6, self.camera)
+        self.world_foreground = CameraGroup(7, self.camera)
 
         self.buttons = pymunk.ShapeFilter(mask=0b0000001)
+        # cosmetic randomness, levels draw from level_random instead
+        self.random = make_random(seed)
 
         self.change_to = False
         self.args = list()
@@ -153,6 +389,8 @@ class GameState(object):
         self.space.gravity = 0, -900
 
         self.event_handlers = []
+        # objects drawn between game ticks, see interpolate
+        self.interpolated = [self.camera]
 
         if bounded:
             # create window physical bounds ###################################
@@ -201,6 +439,55 @@ class GameState(object):
 
             self.event_handlers.append(self.on_mouse_motion)
 
+    @classmethod
+    def generate_level(cls, level_id, store=True):
+        # terrain heights and obstacle layout of a level, loaded from the
+        # level cache when the same level was generated before. store=False
+        # leaves a newly generated level out of the cache, for random ids
+        def generate():
+            x, y = generate_heights(
+                seed=level_random(level_id, "terrain").getrandbits(32),
+                **cls.terrain_options
+            )
+            positions, coords = generate_obstacles(
+                seed=level_random(level_id, "obstacles"), **cls.obstacle_options
+            )
+            return dict(
+                terrain_x=x,
+                terrain_y=y,
+                obstacle_positions=positions,
+                obstacle_coords=coords,
+            )
+
+        options = dict(terrain=cls.terrain_options, obstacles=cls.obstacle_options)
+        return level_cache.get(level_id, options, generate, store)
+
+    @classmethod
+    def preload_level(cls, level_id, store=True):
+        # generate_level on the preloader thread, picked up by load_level,
+        # and the level's background on the resource prefetch thread
+        level_preloader.preload(
+            (cls.name, level_id), lambda: cls.generate_level(level_id, store)
+        )
+        resources.prefetch_parallax(level_random(level_id, "parallax").randrange(6))
+
+    @classmethod
+    def load_level(cls, level_id, store=True):
+        preloaded = level_preloader.take((cls.name, level_id))
+        if preloaded is None:
+            return cls.generate_level(level_id, store)
+        return preloaded
+
+    def can_restart(self, *args, **kwargs):
+        # whether switching to this mode again with these arguments can reset
+        # it in place instead of building it from scratch. modes returning
+        # True define restart(space), which GameLoop.restart_mode calls
+        return False
+
+    def interpolate(self, alpha):
+        for interpolated in self.interpolated:
+            interpolated.interpolate(alpha)
+
     def on_mouse_motion(self, x, y, dx, dy):
         self.mouse_body.position = x, y
         # print(x, y)
@@ -216,12 +503,39 @@ class GameState(object):
 ###############################################################################
 class Menu(GameState):
     id = 1
+    manifest = (
+        "background_img",
+        "game1_button_img",
+        "game1_button_hover_img",
+        "game2_button_img",
+        "game2_button_hover_img",
+        "game3_button_img",
+        "game3_button_hover_img",
+        "game1_hs_button_img",
+        "game1_hs_button_hover_img",
+        "game2_hs_button_img",
+        "game2_hs_button_hover_img",
+        "gravity_button_img",
+        "fullscreen_button_img",
+        *resources.TANK,
+        *resources.MOTORBIKE,
+    )
 
-    def __init__(self, batch, space, window):
-        super().__init__(batch, space, window, mouse_hover=True, bounded=True)
+    def __init__(self, batch, space, window, *args, **kwargs):
+        super().__init__(
+            batch,
+            space,
+            window,
+            mouse_hover=True,
+            bounded=True,
+            seed=kwargs.get("seed"),
+        )
         self.changing_gravity = False
         self.adder = [5, 5]
         self.time = 0
+        # the courses the game buttons start, preloaded while hovered. they
+        # are random, so they are not stored in the level cache
+        self.level_ids = {Game1.id: new_level_id(), Game2.id: new_level_id()}
         self.bg = pyglet.sprite.Sprite(
             img=resources.background_img,
             x=self.window.width // 2,
@@ -231,7 +545,7 @@ class Menu(GameState):
         )
         self.event_handlers.append(self.on_mouse_press)
         # objects #############################################################
-        if choice((1, 2)) == 1:
+        if self.random.choice((1, 2)) == 1:
             self.player = Tank(
                 self.batch,
                 self.space,
@@ -255,7 +569,8 @@ class Menu(GameState):
             self.window,
             mid_height=150,
             end_coordinate=self.window.width + 200,
-            color_set=choice(("green", "gray")),
+            color_set=self.random.choice(("green", "gray")),
+            seed=self.random,
             group=self.background,
         )
         self.obstacles = Obstacles(
@@ -266,6 +581,7 @@ class Menu(GameState):
             frequency=40,
             amount=2,
             x_offset=1600,
+            seed=self.random,
             group=self.back,
         )
         # buttons #############################################################
@@ -326,10 +642,25 @@ class Menu(GameState):
             60,
         )
         #######################################################################
+        self.interpolated.extend(
+            (
+                self.player,
+                self.obstacles,
+                self.game1_button,
+                self.game2_button,
+                self.game3_button,
+                self.game1_hs_button,
+                self.game2_hs_button,
+                self.gravity_button,
+                self.fullscreen_button,
+            )
+        )
         self.window.push_handlers(*self.event_handlers)
         # sound fx ############################################################
         self.player.engine_sound.volume = 0.6
-        self.parallax = ParallaxBG(self.batch, self.window.get_size(), randrange(6))
+        self.parallax = ParallaxBG(
+            self.batch, self.window.get_size(), self.random.randrange(6)
+        )
 
     def on_mouse_hover(self, arbiter, space, data):
         button_shape, mouse_shape = arbiter.shapes
@@ -338,11 +669,13 @@ class Menu(GameState):
             self.game1_button.sprite.rotation = 0
             self.game1_button.sprite.image = resources.game1_button_hover_img
             self.game1_button.sprite.group = self.front
+            Game1.preload_level(self.level_ids[Game1.id], store=False)
         elif button_shape.id == self.game2_button.id:
             self.game2_button.update_rotate = False
             self.game2_button.sprite.rotation = 0
             self.game2_button.sprite.image = resources.game2_button_hover_img
             self.game2_button.sprite.group = self.front
+            Game2.preload_level(self.level_ids[Game2.id], store=False)
         elif button_shape.id == self.game3_button.id:
             self.game3_button.update_rotate = False
             self.game3_button.sprite.rotation = 0
@@ -387,8 +720,12 @@ class Menu(GameState):
         point_q = self.space.point_query_nearest((x, y), 0, self.buttons)
         if point_q:
             if point_q.shape.body.id == self.game1_button.id:
+                self.kwargs["level_id"] = self.level_ids[Game1.id]
+                self.kwargs["store_level"] = False
                 self.change_to = Game1.id
             elif point_q.shape.body.id == self.game2_button.id:
+                self.kwargs["level_id"] = self.level_ids[Game2.id]
+                self.kwargs["store_level"] = False
                 self.change_to = Game2.id
             elif point_q.shape.body.id == self.game3_button.id:
                 self.change_to = Game3.id
@@ -403,8 +740,6 @@ class Menu(GameState):
             elif point_q.shape.body.id == self.fullscreen_button.id:
                 self.window.set_fullscreen(not self.window.fullscreen)
                 self.change_to = Menu.id
-            if self.change_to:
-                self.player.engine_sound.delete()
 
     def update(self):
         self.time += 1 / 60
@@ -440,43 +775,66 @@ class Menu(GameState):
 class Game1(GameState):
     id = 4
     name = "hillclimb"
+    music_volume = 0.1
+    recordable = True
+    manifest = (
+        "finishflag_img",
+        "menu_button_img",
+        "restart_button_img",
+        *resources.TANK,
+        *resources.METERS,
+        *resources.GOAL_METER,
+    )
+    terrain_options = dict(
+        interval=50, mid_height=170, height_change=0.5, end_coordinate=30000
+    )
+    obstacle_options = dict(amount=3)
 
-    def __init__(self, batch, space, window):
+    def __init__(self, batch, space, window, *args, **kwargs):
         super().__init__(batch, space, window)
+        # restarting keeps level_id and vehicle_options in kwargs and replays
+        # the same course with the same vehicle
+        self.level_id = kwargs.get("level_id")
+        # only courses asked for by id go into the level cache
+        store_level = kwargs.get("store_level", self.level_id is not None)
+        if self.level_id is None:
+            self.level_id = new_level_id()
+        self.kwargs["level_id"] = self.level_id
+        level = self.load_level(self.level_id, store_level)
         self.event_handlers.append(self.on_mouse_press)
         self.ENDGAME = False
         self.time = 0
         self.end_position = 27000
+        self.vehicle_options = kwargs.get("vehicle_options", dict())
+        self.kwargs["vehicle_options"] = self.vehicle_options
         # objects #############################################################
-        self.tank1 = Tank(
-            self.batch,
-            self.space,
-            self.window,
-            (window.width // 2 - 120, 550),
-            add_boxlives=True,
-            group=self.background,
-        )
+        self.tank1 = self.create_vehicle()
         self.event_handlers.extend(self.tank1.event_handlers)
         self.terrain = Terrain(
             self.batch,
             self.space,
             self.window,
-            interval=50,
-            mid_height=170,
-            height_change=0.5,
-            group=self.background,
+            heights=(level["terrain_x"], level["terrain_y"]),
+            group=self.world_background,
+            **self.terrain_options
         )
-        self.terrain.update(x_offset=self.window.width // 2 - 520, update_all=True)
         self.obstacles = Obstacles(
-            self.batch, self.space, self.window, amount=3, group=self.back
+            self.batch,
+            self.space,
+            self.window,
+            layout=(level["obstacle_positions"], level["obstacle_coords"]),
+            group=self.world_back,
+            **self.obstacle_options
         )
         # left bound
-        bounds_body = pymunk.Body(body_type=pymunk.Body.STATIC)
-        bounds_body.position = (0, 0)
-        left_bound_s = pymunk.Segment(
-            bounds_body, (300 - 20, 0), (300 - 20, self.window.height), 20
+        self.bounds_body = pymunk.Body(body_type=pymunk.Body.STATIC)
+        self.bounds_body.position = (0, 0)
+        self.left_bound_s = pymunk.Segment(
+            self.bounds_body, (300 - 20, 0), (300 - 20, self.window.height), 20
+        )
+        self.left_bound_s.filter = pymunk.ShapeFilter(
+            categories=0b0001000, mask=0b1110111
         )
-        left_bound_s.filter = pymunk.ShapeFilter(categories=0b0001000, mask=0b1110111)
         # buttons #############################################################
         self.menu_button = pyglet.sprite.Sprite(
             img=resources.menu_button_img,
@@ -486,7 +844,8 @@ class Game1(GameState):
             group=self.front,
         )
         # labels ##############################################################
-        self.score_label = pyglet.text.Label(
+        # set every tick, drawn from a glyph strip
+        self.score_label = HudText(
             "",
             # font_name='Times New Roman',
             font_size=36,
@@ -497,6 +856,7 @@ class Game1(GameState):
             anchor_y="baseline",
             batch=self.batch,
             group=self.front,
+            charset=DIGITS + "pts",
         )
         # sprites #############################################################
         # finish flag sprite
@@ -505,7 +865,7 @@ class Game1(GameState):
             x=self.end_position,
             y=self.window.height // 2 - 100,
             batch=self.batch,
-            group=self.back,
+            group=self.world_back,
         )
         # motor meter sprite
         self.motormeter_sprite = MeterSprite(
@@ -522,11 +882,59 @@ class Game1(GameState):
             group=self.background,
         )
         #######################################################################
-        self.space.add(bounds_body, left_bound_s)
+        self.space.add(self.bounds_body, self.left_bound_s)
+        self.interpolated.extend((self.tank1, self.obstacles))
         self.window.push_handlers(*self.event_handlers)
         # sound fx ############################################################
         self.tank1.engine_sound.volume = 1
-        self.parallax = ParallaxBG(self.batch, self.window.get_size(), randrange(6))
+        self.parallax = ParallaxBG(
+            self.batch,
+            self.window.get_size(),
+            level_random(self.level_id, "parallax").randrange(6),
+            camera=self.camera,
+        )
+        self.interpolated.append(self.parallax)  # after the camera
+
+    def create_vehicle(self):
+        return Tank(
+            self.batch,
+            self.space,
+            self.window,
+            (self.window.width // 2 - 120, 550),
+            add_boxlives=True,
+            group=self.world_background,
+            **self.vehicle_options
+        )
+
+    def can_restart(self, *args, **kwargs):
+        return (
+            kwargs.get("level_id") == self.level_id
+            and kwargs.get("vehicle_options", dict()) == self.vehicle_options
+        )
+
+    def restart(self, space):
+        # the same course again: terrain, sprites and labels are kept, the
+        # tank and the obstacles are rebuilt and everything is added to the
+        # new space in the order __init__ adds it
+        self.space = space
+        self.space.gravity = 0, -900
+        self.change_to = False
+        self.kwargs = dict(level_id=self.level_id, vehicle_options=self.vehicle_options)
+        if self.ENDGAME:
+            self.restart_button.sprite.delete()
+        self.ENDGAME = False
+        self.time = 0
+        self.camera.reset()
+        self.parallax.reset()
+        self.tank1.delete()
+        self.tank1 = self.create_vehicle()
+        self.terrain.reset(self.space)
+        self.obstacles.reset(self.space)
+        self.space.add(self.bounds_body, self.left_bound_s)
+        self.event_handlers = [self.on_mouse_press, *self.tank1.event_handlers]
+        self.interpolated = [self.camera, self.tank1, self.obstacles, self.parallax]
+        self.window.push_handlers(*self.event_handlers)
+        self.tank1.engine_sound.volume = 1
 
     def on_mouse_press(self, x, y, button, modifier):
         if (
@@ -537,22 +945,24 @@ class Game1(GameState):
             < y
             < self.menu_button.y + self.menu_button.height // 2
         ):
-            self.tank1.engine_sound.delete()
             self.change_to = Menu.id
         else:
-            x += self.tank1.position[0] - 400
+            x += self.camera.x
             point_q = self.space.point_query_nearest((x, y), 0, self.buttons)
             if point_q:
                 if point_q.shape.body.id == self.restart_button.id:
-                    self.tank1.engine_sound.delete()
                     self.change_to = Game1.id
 
     def update(self):
         # update variables
-        offset = self.tank1.position[0] - 400
+        # follow the chassis body, self.tank1.position lags a frame behind
+        profiler = self.window.profiler
+        offset = self.tank1.chassis.body.position.x - 400
+        self.camera.update(offset)
         self.time += 1 / 60
         score = 0 if self.ENDGAME else -self.time + self.tank1.lives * 10 + 130
-        self.score_label.text = "{:.1f} pts".format(score)
+        with profiler.section("labels"):
+            self.score_label.text = "{:.1f} pts".format(score)
 
         # if player is dead
         if not self.ENDGAME and (self.tank1.lives == 0 or score < 0):
@@ -566,7 +976,9 @@ class Game1(GameState):
                 (self.tank1.position[0], self.tank1.position[1] + 130),
                 resources.restart_button_img,
                 60,
+                group=self.world_foreground,
             )
+            self.interpolated.append(self.restart_button)
             ###################################################################
 
         # if player won
@@ -574,72 +986,92 @@ class Game1(GameState):
             self.tank1.torque = 0
             self.kwargs["score"] = score
             self.kwargs["game"] = self.name
-            self.tank1.engine_sound.delete()
             self.change_to = Endgame.id
 
         # update sprites
-        self.finishflag_sprite.update(x=self.end_position - offset)
-        self.motormeter_sprite.update(
-            abs(self.tank1.wheels[0].body.angular_velocity) / 130
-        )
-        self.speedmeter_sprite.update(abs(self.tank1.chassis.body.velocity.x) / 650)
-        self.goalmeter_sprite.update(self.tank1.position[0] / self.end_position)
-        self.parallax.update(offset=offset)
+        with profiler.section("meters"):
+            self.motormeter_sprite.update(
+                abs(self.tank1.wheels[0].body.angular_velocity) / 130
+            )
+            self.speedmeter_sprite.update(
+                abs(self.tank1.chassis.body.velocity.x) / 650
+            )
+            self.goalmeter_sprite.update(self.tank1.position[0] / self.end_position)
         # update objects
-        if self.ENDGAME:
-            self.restart_button.update(offset)
-        self.tank1.update(offset)
-        self.terrain.update(offset)
-        self.obstacles.update(offset)
+        with profiler.section("vehicle"):
+            if self.ENDGAME:
+                self.restart_button.update()
+            self.tank1.update()
+        with profiler.section("terrain"):
+            self.terrain.update(offset)
+        with profiler.section("obstacles"):
+            self.obstacles.update(offset)
 
 
 ###############################################################################
 class Game2(GameState):
     id = 5
     name = "motor_race"
+    music_volume = 0.1
+    recordable = True
+    manifest = (
+        "finishflag_img",
+        "menu_button_img",
+        *resources.MOTORBIKE,
+        *resources.METERS,
+        *resources.GOAL_METER,
+    )
+    terrain_options = dict(
+        interval=120, mid_height=170, height_change=0.3, end_coordinate=30000
+    )
+    obstacle_options = dict(radius_range=(10, 20), frequency=150, amount=1)
 
-    def __init__(self, batch, space, window):
+    def __init__(self, batch, space, window, *args, **kwargs):
         super().__init__(batch, space, window)
+        # restarting keeps level_id and vehicle_options in kwargs and replays
+        # the same course with the same vehicle
+        self.level_id = kwargs.get("level_id")
+        # only courses asked for by id go into the level cache
+        store_level = kwargs.get("store_level", self.level_id is not None)
+        if self.level_id is None:
+            self.level_id = new_level_id()
+        self.kwargs["level_id"] = self.level_id
+        level = self.load_level(self.level_id, store_level)
         self.event_handlers.append(self.on_mouse_press)
         self.ENDGAME = False
         self.time = 0
         self.end_position = 27000
+        self.vehicle_options = kwargs.get("vehicle_options", dict())
+        self.kwargs["vehicle_options"] = self.vehicle_options
         # objects #############################################################
-        self.motorbike = MotorBike(
-            self.batch,
-            self.space,
-            self.window,
-            (window.width // 2 - 120, 550),
-            group=self.background,
-        )
+        self.motorbike = self.create_vehicle()
         self.event_handlers.extend(self.motorbike.event_handlers)
         self.terrain = Terrain(
             self.batch,
             self.space,
             self.window,
-            interval=120,
-            mid_height=170,
-            height_change=0.3,
             color_set="gray",
-            group=self.background,
+            heights=(level["terrain_x"], level["terrain_y"]),
+            group=self.world_background,
+            **self.terrain_options
         )
-        self.terrain.update(x_offset=self.window.width // 2 - 520, update_all=True)
         self.obstacles = Obstacles(
             self.batch,
             self.space,
             self.window,
-            radius_range=(10, 20),
-            frequency=150,
-            amount=1,
-            group=self.back,
+            layout=(level["obstacle_positions"], level["obstacle_coords"]),
+            group=self.world_back,
+            **self.obstacle_options
         )
         # left bound
-        bounds_body = pymunk.Body(body_type=pymunk.Body.STATIC)
-        bounds_body.position = (0, 0)
-        left_bound_s = pymunk.Segment(
-            bounds_body, (300 - 20, 0), (300 - 20, self.window.height), 20
+        self.bounds_body = pymunk.Body(body_type=pymunk.Body.STATIC)
+        self.bounds_body.position = (0, 0)
+        self.left_bound_s = pymunk.Segment(
+            self.bounds_body, (300 - 20, 0), (300 - 20, self.window.height), 20
+        )
+        self.left_bound_s.filter = pymunk.ShapeFilter(
+            categories=0b0001000, mask=0b1110111
         )
-        left_bound_s.filter = pymunk.ShapeFilter(categories=0b0001000, mask=0b1110111)
         # buttons #############################################################
         self.menu_button = pyglet.sprite.Sprite(
             img=resources.menu_button_img,
@@ -649,7 +1081,8 @@ class Game2(GameState):
             group=self.front,
         )
         # labels ##############################################################
-        self.time_label = pyglet.text.Label(
+        # set every tick, drawn from a glyph strip
+        self.time_label = HudText(
             "",
             # font_name='Times New Roman',
             font_size=36,
@@ -660,6 +1093,7 @@ class Game2(GameState):
             anchor_y="baseline",
             batch=self.batch,
             group=self.front,
+            charset=DIGITS + "s",
         )
         # sprites #############################################################
         # finish flag sprite
@@ -668,7 +1102,7 @@ class Game2(GameState):
             x=self.end_position,
             y=self.window.height // 2 - 100,
             batch=self.batch,
-            group=self.back,
+            group=self.world_back,
         )
         # motor meter sprite
         self.motormeter_sprite = MeterSprite(
@@ -685,11 +1119,54 @@ class Game2(GameState):
             group=self.background,
         )
         #######################################################################
-        self.space.add(bounds_body, left_bound_s)
+        self.space.add(self.bounds_body, self.left_bound_s)
+        self.interpolated.extend((self.motorbike, self.obstacles))
         self.window.push_handlers(*self.event_handlers)
         # sound fx ############################################################
         self.motorbike.engine_sound.volume = 0.8
-        self.parallax = ParallaxBG(self.batch, self.window.get_size(), randrange(6))
+        self.parallax = ParallaxBG(
+            self.batch,
+            self.window.get_size(),
+            level_random(self.level_id, "parallax").randrange(6),
+            camera=self.camera,
+        )
+        self.interpolated.append(self.parallax)  # after the camera
+
+    def create_vehicle(self):
+        return MotorBike(
+            self.batch,
+            self.space,
+            self.window,
+            (self.window.width // 2 - 120, 550),
+            group=self.world_background,
+            **self.vehicle_options
+        )
+
+    def can_restart(self, *args, **kwargs):
+        return (
+            kwargs.get("level_id") == self.level_id
+            and kwargs.get("vehicle_options", dict()) == self.vehicle_options
+        )
+
+    def restart(self, space):
+        # see Game1.restart
+        self.space = space
+        self.space.gravity = 0, -900
+        self.change_to = False
+        self.kwargs = dict(level_id=self.level_id, vehicle_options=self.vehicle_options)
+        self.ENDGAME = False
+        self.time = 0
+        self.camera.reset()
+        self.parallax.reset()
+        self.motorbike.delete()
+        self.motorbike = self.create_vehicle()
+        self.terrain.reset(self.space)
+        self.obstacles.reset(self.space)
+        self.space.add(self.bounds_body, self.left_bound_s)
+        self.event_handlers = [self.on_mouse_press, *self.motorbike.event_handlers]
+        self.interpolated = [self.camera, self.motorbike, self.obstacles, self.parallax]
+        self.window.push_handlers(*self.event_handlers)
+        self.motorbike.engine_sound.volume = 0.8
 
     def on_mouse_press(self, x, y, button, modifier):
         if (
@@ -700,46 +1177,61 @@ class Game2(GameState):
             < y
             < self.menu_button.y + self.menu_button.height // 2
         ):
-            self.motorbike.engine_sound.delete()
             self.change_to = Menu.id
 
     def update(self):
         # update variables
+        profiler = self.window.profiler
         self.time += 1 / 60
-        self.time_label.text = "{:.1f} s".format(self.time)
-        offset = self.motorbike.position[0] - 400
+        with profiler.section("labels"):
+            self.time_label.text = "{:.1f} s".format(self.time)
+        offset = self.motorbike.chassis.body.position.x - 400
+        self.camera.update(offset)
 
         # if player won
         if self.motorbike.position[0] > self.end_position:
             self.motorbike.torque = 0
             self.kwargs["score"] = self.time
             self.kwargs["game"] = self.name
-            self.motorbike.engine_sound.delete()
             self.change_to = Endgame.id
 
         # update sprites
-        self.finishflag_sprite.update(x=self.end_position - offset)
-        self.motormeter_sprite.update(
-            abs(self.motorbike.wheels[0].body.angular_velocity) / 35
-        )
-        self.speedmeter_sprite.update(
-            abs(self.motorbike.chassis.body.velocity.x) / 1100
-        )
-        self.goalmeter_sprite.update(self.motorbike.position[0] / self.end_position)
-        self.parallax.update(offset=offset)
+        with profiler.section("meters"):
+            self.motormeter_sprite.update(
+                abs(self.motorbike.wheels[0].body.angular_velocity) / 35
+            )
+            self.speedmeter_sprite.update(
+                abs(self.motorbike.chassis.body.velocity.x) / 1100
+            )
+            self.goalmeter_sprite.update(
+                self.motorbike.position[0] / self.end_position
+            )
         # update objects
-        self.motorbike.update(offset)
-        self.terrain.update(offset)
-        self.obstacles.update(offset)
+        with profiler.section("vehicle"):
+            self.motorbike.update()
+        with profiler.section("terrain"):
+            self.terrain.update(offset)
+        with profiler.section("obstacles"):
+            self.obstacles.update(offset)
 
 
 ###############################################################################
 class Game3(GameState):
     id = 6
     name = "volleyball"
+    recordable = True
+    manifest = ("menu_button_img", *resources.VOLLEYBALL, *resources.METERS)
 
-    def __init__(self, batch, space, window):
-        super().__init__(batch, space, window)
+    def __init__(self, batch, space, window, *args, **kwargs):
+        # seeds the ball drops, restarting with level_id replays the match
+        level_id = kwargs.get("level_id")
+        if level_id is None:
+            level_id = new_level_id()
+        super().__init__(
+            batch, space, window, seed=level_random(level_id, "volleyball")
+        )
+        self.level_id = level_id
+        self.kwargs["level_id"] = level_id
         self.keys = pyglet.window.key.KeyStateHandler()
         self.event_handlers.extend((self.keys, self.on_mouse_press))
 
@@ -775,7 +1267,11 @@ class Game3(GameState):
         self.space.add(bounds_body, *bounds_shapes)
         self.ball = None
         self.floor = SymmetricTerrain(
-            self.batch, self.space, self.window, group=self.background
+            self.batch,
+            self.space,
+            self.window,
+            seed=self.random,
+            group=self.background,
         )
         net_body = pymunk.Body(body_type=pymunk.Body.STATIC)
         net_body.position = (self.window.width // 2, 160)
@@ -833,7 +1329,7 @@ class Game3(GameState):
             batch=self.batch,
             group=self.front,
         )
-        self.p1score_label = pyglet.text.Label(
+        self.p1score_label = HudText(
             "2",
             # font_name='Times New Roman',
             font_size=56,
@@ -845,7 +1341,7 @@ class Game3(GameState):
             batch=self.batch,
             group=self.front,
         )
-        self.p2score_label = pyglet.text.Label(
+        self.p2score_label = HudText(
             "1",
             # font_name='Times New Roman',
             font_size=56,
@@ -868,7 +1364,9 @@ class Game3(GameState):
         # sound fx ############################################################
         self.player1.engine_sound.volume = 0.6
         self.player2.engine_sound.volume = 0.6
-        self.parallax = ParallaxBG(self.batch, self.window.get_size(), randrange(6))
+        self.parallax = ParallaxBG(
+            self.batch, self.window.get_size(), self.random.randrange(6)
+        )
         #######################################################################
         self.space.add_collision_handler(
             self.COLLTYPE_VB_BALL, self.COLLTYPE_VB_PLAYER1
@@ -876,11 +1374,14 @@ class Game3(GameState):
         self.space.add_collision_handler(
             self.COLLTYPE_VB_BALL, self.COLLTYPE_VB_PLAYER2
         ).begin = self.player1_scored
+        self.interpolated.extend((self.player1, self.player2))
         self.window.push_handlers(*self.event_handlers)
-        pyglet.clock.schedule_once(self.dialog, 0, message="Game Start!")
-        pyglet.clock.schedule_once(self.dialog, 1, message="Dropping ball in:")
-        pyglet.clock.schedule_once(self.dialog, 2, message=3)
-        pyglet.clock.schedule_once(self.spawn_ball, 5, side=choice((1, 2)))
+        self.window.clock.schedule_once(self.dialog, 0, message="Game Start!")
+        self.window.clock.schedule_once(self.dialog, 1, message="Dropping ball in:")
+        self.window.clock.schedule_once(self.dialog, 2, message=3)
+        self.window.clock.schedule_once(
+            self.spawn_ball, 5, side=self.random.choice((1, 2))
+        )
 
     def on_mouse_press(self, x, y, button, modifier):
         if (
@@ -891,8 +1392,6 @@ class Game3(GameState):
             < y
             < self.menu_button.y + self.menu_button.height // 2
         ):
-            self.player1.engine_sound.delete()
-            self.player2.engine_sound.delete()
             self.change_to = Menu.id
 
     def player1_scored(self, arbiter, space, data):
@@ -900,14 +1399,14 @@ class Game3(GameState):
         print("player1 scored")
         self.player1.score += 1
         if self.player1.score == 7:
-            pyglet.clock.schedule_once(self.dialog, 0, message="Player 1 wins!")
+            self.window.clock.schedule_once(self.dialog, 0, message="Player 1 wins!")
         else:
-            pyglet.clock.schedule_once(self.dialog, 0, message="Player 1 scored!")
-            pyglet.clock.schedule_once(
+            self.window.clock.schedule_once(self.dialog, 0, message="Player 1 scored!")
+            self.window.clock.schedule_once(
                 self.dialog, 1, message="Dropping ball for player 2"
             )
-            pyglet.clock.schedule_once(self.dialog, 2, message=2)
-            pyglet.clock.schedule_once(self.spawn_ball, 4, side=1)
+            self.window.clock.schedule_once(self.dialog, 2, message=2)
+            self.window.clock.schedule_once(self.spawn_ball, 4, side=1)
         return True
 
     def player2_scored(self, arbiter, space, data):
@@ -915,30 +1414,30 @@ class Game3(GameState):
         print("player2 scored")
         self.player2.score += 1
         if self.player2.score == 7:
-            pyglet.clock.schedule_once(self.dialog, 0, message="Player 2 wins!")
+            self.window.clock.schedule_once(self.dialog, 0, message="Player 2 wins!")
         else:
-            pyglet.clock.schedule_once(self.dialog, 0, message="Player 2 scored!")
-            pyglet.clock.schedule_once(
+            self.window.clock.schedule_once(self.dialog, 0, message="Player 2 scored!")
+            self.window.clock.schedule_once(
                 self.dialog, 1, message="Dropping ball for player 1"
             )
-            pyglet.clock.schedule_once(self.dialog, 2, message=2)
-            pyglet.clock.schedule_once(self.spawn_ball, 4, side=2)
+            self.window.clock.schedule_once(self.dialog, 2, message=2)
+            self.window.clock.schedule_once(self.spawn_ball, 4, side=2)
         return True
 
     def dialog(self, dt, message, dismiss=False):
         if isinstance(message, int):
-            pyglet.clock.schedule_once(self.countdown, 0, message)
+            self.window.clock.schedule_once(self.countdown, 0, message)
         else:
             self.dialog_label.text = message
         if dismiss:
-            pyglet.clock.schedule_once(self.dismiss_dialog, 3)
+            self.window.clock.schedule_once(self.dismiss_dialog, 3)
 
     def countdown(self, dt, x):
         if x == 0:
             self.dialog_label.text = ""
         else:
             self.dialog_label.text = str(x)
-            pyglet.clock.schedule_once(self.countdown, 1, x - 1)
+            self.window.clock.schedule_once(self.countdown, 1, x - 1)
 
     def dismiss_dialog(self, dt):
         self.dialog_label.text = ""
@@ -962,6 +1461,11 @@ class Game3(GameState):
             group=self.front,
         )
 
+    def interpolate(self, alpha):
+        super().interpolate(alpha)
+        if self.ball:
+            self.ball.interpolate(alpha)
+
     def update(self):
         # update variables
         self.time += 1 / 60
@@ -1033,16 +1537,26 @@ class Game3(GameState):
 ###############################################################################
 class HighScore(GameState):
     id = 3
+    manifest = ("menu_button_img", *resources.TANK, *resources.MOTORBIKE)
 
     def __init__(self, batch, space, window, *args, **kwargs):
-        super().__init__(batch, space, window, mouse_hover=True, bounded=True)
+        # the seed fixes the cosmetic terrain, obstacles and autopilot
+        super().__init__(
+            batch,
+            space,
+            window,
+            mouse_hover=True,
+            bounded=True,
+            seed=kwargs.get("seed"),
+        )
         self.score = kwargs.get("score")
         self.game = kwargs.get("game")
         self.choice = 0
         self.time = 0
 
-        self.names_text = "None"
-        self.scores_text = "None"
+        # laid out once from the cached leaderboard columns
+        columns = leaderboards.columns(self.game) or ("None", "None")
+        self.scores_text, self.names_text = columns
         # objects #############################################################
         if self.game == Game1.name:
             self.player = Tank(
@@ -1069,6 +1583,7 @@ class HighScore(GameState):
             mid_height=400,
             end_coordinate=self.window.width + 200,
             color_set=color_set,
+            seed=self.random,
             group=self.background,
         )
         self.obstacles = Obstacles(
@@ -1080,6 +1595,7 @@ class HighScore(GameState):
             amount=1,
             x_offset=1600,
             min_height=450,
+            seed=self.random,
             group=self.background,
         )
         # buttons #############################################################
@@ -1124,17 +1640,19 @@ class HighScore(GameState):
         #######################################################################
         self.event_handlers.extend((self.on_mouse_press,))
 
+        self.interpolated.extend((self.player, self.obstacles))
         self.window.push_handlers(*self.event_handlers)
 
-        self.update_hs_text()
         # sound fx ############################################################
         self.player.engine_sound.volume = 0.6
-        self.parallax = ParallaxBG(self.batch, self.window.get_size(), randrange(6))
+        self.parallax = ParallaxBG(
+            self.batch, self.window.get_size(), self.random.randrange(6)
+        )
 
     def update(self):
         self.time += 1 / 60
         self.parallax.update(self.time * 150)
-        self.choice = (self.choice + choice((-1, 1))) % 12
+        self.choice = (self.choice + self.random.choice((-1, 1))) % 12
         if self.choice >= 6:
             self.player.forward()
         else:
@@ -1144,17 +1662,6 @@ class HighScore(GameState):
         self.score_scroll.update()
         self.name_scroll.update()
 
-    def update_hs_text(self):  # 38 chars
-        self.scores_text = ""
-        self.names_text = ""
-        highscores = get_highscores("{}.csv".format(self.game))
-        if highscores:
-            for hs_set in highscores:
-                self.scores_text += "{:>5.1f}\n".format(hs_set[1])
-                self.names_text += "{:<32}\n".format(hs_set[0])
-            self.score_scroll.update_text(self.scores_text)
-            self.name_scroll.update_text(self.names_text)
-
     def on_mouse_press(self, x, y, button, modifiers):
         if (
             self.menu_button.x - self.menu_button.width // 2
@@ -1164,16 +1671,30 @@ class HighScore(GameState):
             < y
             < self.menu_button.y + self.menu_button.height // 2
         ):
-            self.player.engine_sound.delete()
             self.change_to = Menu.id
 
 
 ###############################################################################
 class Endgame(GameState):
     id = 2
+    manifest = (
+        "menu_button_img",
+        "enter_button_img",
+        "enter_button_hover_img",
+        *resources.TANK,
+        *resources.MOTORBIKE,
+    )
 
     def __init__(self, batch, space, window, *args, **kwargs):
-        super().__init__(batch, space, window, mouse_hover=True, bounded=True)
+        # the seed fixes the cosmetic terrain, obstacles and autopilot
+        super().__init__(
+            batch,
+            space,
+            window,
+            mouse_hover=True,
+            bounded=True,
+            seed=kwargs.get("seed"),
+        )
         self.score = kwargs.get("score")
         self.game = kwargs.get("game")
         self.choice = 0
@@ -1185,8 +1706,9 @@ class Endgame(GameState):
             self.units = " pts"
         else:
             self.units = ""
-        self.names_text = "None"
-        self.scores_text = "None"
+        # laid out once from the cached leaderboard columns
+        columns = leaderboards.columns(self.game) or ("None", "None")
+        self.scores_text, self.names_text = columns
         # objects #############################################################
         if self.game == Game1.name:
             self.player = Tank(
@@ -1213,6 +1735,7 @@ class Endgame(GameState):
             mid_height=400,
             end_coordinate=self.window.width + 200,
             color_set=color_set,
+            seed=self.random,
             group=self.background,
         )
         self.obstacles = Obstacles(
@@ -1224,6 +1747,7 @@ class Endgame(GameState):
             amount=1,
             x_offset=1600,
             min_height=450,
+            seed=self.random,
             group=self.background,
         )
         # buttons #############################################################
@@ -1319,17 +1843,19 @@ class Endgame(GameState):
             )
         )
 
+        self.interpolated.extend((self.player, self.obstacles, self.enter_button))
         self.window.push_handlers(*self.event_handlers)
 
-        self.update_hs_text()
         # sound fx ############################################################
         self.player.engine_sound.volume = 0.6
-        self.parallax = ParallaxBG(self.batch, self.window.get_size(), randrange(6))
+        self.parallax = ParallaxBG(
+            self.batch, self.window.get_size(), self.random.randrange(6)
+        )
 
     def update(self):
         self.time += 1 / 60
         self.parallax.update(self.time * 150)
-        self.choice = (self.choice + choice((-1, 1))) % 12
+        self.choice = (self.choice + self.random.choice((-1, 1))) % 12
         if self.choice >= 6:
             self.player.forward()
         else:
@@ -1341,13 +1867,10 @@ class Endgame(GameState):
         self.name_scroll.update()
 
     def update_hs_text(self):  # 38 chars
-        self.scores_text = ""
-        self.names_text = ""
-        highscores = get_highscores("{}.csv".format(self.game))
-        if highscores:
-            for hs_set in highscores:
-                self.scores_text += "{:>5.1f}\n".format(hs_set[1])
-                self.names_text += "{:<32}\n".format(hs_set[0])
+        # the name just entered, the columns come formatted from the cache
+        columns = leaderboards.columns(self.game)
+        if columns:
+            self.scores_text, self.names_text = columns
             self.score_scroll.update_text(self.scores_text)
             self.name_scroll.update_text(self.names_text)
 
@@ -1362,7 +1885,6 @@ class Endgame(GameState):
         ):
             if self.userinput:
                 self.__name_entered()
-            self.player.engine_sound.delete()
             self.change_to = Menu.id
         elif self.userinput:
             self.userinput.caret.on_mouse_press(x, y, button, modifiers)
@@ -1377,7 +1899,7 @@ class Endgame(GameState):
         self.userinput.caret.on_mouse_drag(x, y, dx, dy, buttons, modifiers)
 
     def on_text(self, text):
-        if text not in whitespace and text != ",":
+        if text not in whitespace:
             self.userinput.caret.on_text(text)
 
     def on_text_motion(self, motion):
@@ -1402,16 +1924,7 @@ class Endgame(GameState):
             self.enter_button.sprite.image = resources.enter_button_img
 
     def __name_entered(self):
-        if self.game == Game1.name:
-            ascending = False
-        if self.game == Game2.name:
-            ascending = True
-        add_highscore(
-            "{}.csv".format(self.game),
-            self.userinput.document.text,
-            self.score,
-            ascending=ascending,
-        )
+        leaderboards.submit(self.game, self.userinput.document.text, self.score)
         del self.userinput
         self.userinput = None
         self.window.pop_handlers()
@@ -1421,7 +1934,29 @@ class Endgame(GameState):
         self.update_hs_text()
 
 
+###############################################################################
+modes = {
+    mode.id: mode for mode in (Menu, Endgame, HighScore, Game1, Game2, Game3)
+}
+# leaderboard order: most points first in hillclimb, shortest time first in
+# motor_race
+ascending_scores = {Game1.name: False, Game2.name: True}
+leaderboards = LeaderboardCache(score_writer, ascending_scores)
+
 ###############################################################################
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hill climb and volleyball game")
+    parser.add_argument(
+        "--record", action="store_true", help="save a replay of every game run"
+    )
+    parser.add_argument("--replay", metavar="FILE", help="play back a replay")
+    parser.add_argument(
+        "--speed", type=float, default=1.0, help="game speed, e.g. 4 fast forwards"
+    )
+    args = parser.parse_args()
     window = Window(1280, 720, "Version 8", resizeable=False)
+    window.record_runs = args.record
+    window.speed = args.speed
+    if args.replay:
+        window.play_replay(Replay.load(args.replay))
     pyglet.app.run()
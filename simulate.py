@@ -0,0 +1,103 @@
+"""Runs game modes headlessly, faster than real time, for balancing.
+
+    python simulate.py --mode hillclimb --runs 100
+    python simulate.py --mode hillclimb --level 1234
+    python simulate.py --replay replays/hillclimb_1234_20190501_120000.replay
+"""
+import argparse
+import time
+
+import engine.headless as headless
+
+headless.enable()
+
+from pyglet.window import key  # noqa: E402
+
+import game  # noqa: E402
+from engine.replay import Replay  # noqa: E402
+
+GAMES = {game.Game1.name: game.Game1, game.Game2.name: game.Game2}
+
+
+def outcome(window, frames):
+    state = window.activated_mode
+    result = dict(
+        level=state.level_id,
+        frames=frames,
+        finished=state.change_to == game.Endgame.id,
+        score=state.kwargs.get("score"),
+    )
+    vehicle = getattr(state, "tank1", None) or getattr(state, "motorbike", None)
+    if vehicle:
+        result.update(
+            lives=getattr(vehicle, "lives", None), distance=round(vehicle.position[0])
+        )
+    else:  # volleyball
+        result.update(score="{}-{}".format(state.player1.score, state.player2.score))
+    return result
+
+
+def simulate(mode, frames=60 * 180, level_id=None, profile=None):
+    # one run holding the throttle, returns a dict describing the outcome
+    window = game.HeadlessWindow(mode=mode.id, level_id=level_id)
+    window.dispatch_event("on_key_press", key.D, 0)
+    frames = window.run(frames)
+    if profile:
+        window.profiler.dump(profile)
+    return outcome(window, frames)
+
+
+def replay(filename, profile=None):
+    # plays a recorded run back as fast as possible
+    recorded = Replay.load(filename)
+    window = game.HeadlessWindow()
+    window.play_replay(recorded)
+    frames = window.run(recorded.frames, stop_at_end=False)
+    if profile:
+        window.profiler.dump(profile)
+    return outcome(window, frames)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=sorted(GAMES), default=game.Game1.name)
+    parser.add_argument("--runs", type=int, default=1)
+    parser.add_argument("--frames", type=int, default=60 * 180)
+    parser.add_argument(
+        "--level", type=int, help="level id to replay, random for each run if unset"
+    )
+    parser.add_argument(
+        "--substeps", type=int, default=1, help="physics steps per game tick"
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="FILE",
+        help="write the frame profile of the last run, .csv or .json",
+    )
+    parser.add_argument(
+        "--replay", metavar="FILE", help="play back a recorded run instead"
+    )
+    args = parser.parse_args()
+    game.GameLoop.substeps = args.substeps
+
+    start = time.perf_counter()
+    for run in range(args.runs):
+        if args.replay:
+            result = replay(args.replay, args.profile)
+        else:
+            result = simulate(GAMES[args.mode], args.frames, args.level, args.profile)
+        print(
+            "run {}: {}".format(
+                run, " ".join("{}={}".format(*item) for item in result.items())
+            )
+        )
+    elapsed = time.perf_counter() - start
+    print(
+        "{} runs in {:.1f} s ({:.1f} runs/min)".format(
+            args.runs, elapsed, 60 * args.runs / elapsed
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""Sweeps vehicle parameters over fixed courses with a scripted throttle.
+
+    python sweep.py --mode hillclimb torque=200000,300000 spring_stiffness=150,250
+    python sweep.py --mode motor_race --random 40 torque=80000:160000 speed=25:45
+
+Every configuration drives the same courses, one process per trial, and is
+reported with its completion time, joint error and physics cost.
+"""
+import argparse
+import csv
+import inspect
+import itertools
+import random
+import statistics
+from concurrent.futures import ProcessPoolExecutor
+
+import engine.headless as headless
+
+headless.enable()
+
+from pyglet.window import key  # noqa: E402
+
+import game  # noqa: E402
+from engine.player import MotorBike, Tank  # noqa: E402
+
+SEED = 1234
+GAMES = {game.Game1.name: (game.Game1, Tank), game.Game2.name: (game.Game2, MotorBike)}
+# constructor arguments that place the vehicle rather than tune it
+FIXED = ("self", "batch", "space", "window", "position", "side", "group")
+
+
+def tunable(vehicle_class):
+    return [
+        name
+        for name in inspect.signature(vehicle_class.__init__).parameters
+        if name not in FIXED
+    ]
+
+
+def parse_value(text):
+    return float(text) if "." in text or "e" in text else int(text)
+
+
+def grid(specs):
+    # name=1,2,3 for every name, all combinations
+    names, values = [], []
+    for spec in specs:
+        name, listed = spec.split("=")
+        names.append(name)
+        values.append([parse_value(value) for value in listed.split(",")])
+    return [dict(zip(names, combination)) for combination in itertools.product(*values)]
+
+
+def random_search(specs, count, seed):
+    # name=low:high for every name, count uniform samples
+    rng = random.Random(seed)
+    ranges = []
+    for spec in specs:
+        name, bounds = spec.split("=")
+        low, high = (parse_value(bound) for bound in bounds.split(":"))
+        ranges.append((name, low, high))
+    configurations = []
+    for sample in range(count):
+        configuration = dict()
+        for name, low, high in ranges:
+            if isinstance(low, int) and isinstance(high, int):
+                configuration[name] = rng.randint(low, high)
+            else:
+                configuration[name] = round(rng.uniform(low, high), 4)
+        configurations.append(configuration)
+    return configurations
+
+
+def trial(mode_name, options, level_id, frames):
+    # one run holding the throttle from the first frame, like simulate.py
+    mode = GAMES[mode_name][0]
+    window = game.HeadlessWindow(
+        mode=mode.id, level_id=level_id, vehicle_options=options
+    )
+    state = window.activated_mode
+    vehicle = getattr(state, "tank1", None) or state.motorbike
+    joints = getattr(vehicle, "thread_joints", None)  # the tank's tread
+    window.dispatch_event("on_key_press", key.D, 0)
+    errors = []
+    for frame in range(frames):
+        window.run(1)
+        errors.append(vehicle.joint_error(joints))
+        if state.change_to or state.ENDGAME:
+            break
+    finished = state.change_to == game.Endgame.id
+    return dict(
+        finished=finished,
+        seconds=(frame + 1) / window.tick_rate if finished else None,
+        distance=vehicle.chassis.body.position.x,
+        max_joint_error=max(errors),
+        mean_joint_error=statistics.mean(errors),
+        physics_ms=window.profiler.stats()["physics"][0],
+    )
+
+
+def summarize(options, trials):
+    finished = [result["seconds"] for result in trials if result["finished"]]
+    row = dict(options)
+    row.update(
+        finished="{}/{}".format(len(finished), len(trials)),
+        mean_seconds=round(statistics.mean(finished), 2) if finished else None,
+        mean_distance=round(statistics.mean(r["distance"] for r in trials)),
+        max_joint_error=round(max(r["max_joint_error"] for r in trials), 3),
+        mean_joint_error=round(
+            statistics.mean(r["mean_joint_error"] for r in trials), 3
+        ),
+        physics_ms=round(statistics.mean(r["physics_ms"] for r in trials), 4),
+    )
+    return row
+
+
+def sweep(mode_name, configurations, level_ids, frames, workers=None):
+    # returns a summary row per configuration, fastest completions first
+    with ProcessPoolExecutor(workers) as executor:
+        futures = [
+            [
+                executor.submit(trial, mode_name, options, level_id, frames)
+                for level_id in level_ids
+            ]
+            for options in configurations
+        ]
+        rows = [
+            summarize(options, [future.result() for future in trials])
+            for options, trials in zip(configurations, futures)
+        ]
+    unfinished = float("inf")
+    rows.sort(
+        key=lambda row: (
+            -int(row["finished"].split("/")[0]),
+            row["mean_seconds"] or unfinished,
+            -row["mean_distance"],
+        )
+    )
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=sorted(GAMES), default=game.Game1.name)
+    parser.add_argument(
+        "parameters",
+        nargs="+",
+        metavar="NAME=VALUES",
+        help="name=a,b,c for a grid, name=low:high with --random",
+    )
+    parser.add_argument(
+        "--random", type=int, metavar="N", help="sample N configurations instead"
+    )
+    parser.add_argument("--levels", type=int, default=3, help="courses per trial")
+    parser.add_argument("--frames", type=int, default=60 * 180)
+    parser.add_argument("--workers", type=int, help="processes, one per core if unset")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--output", help="write the results as csv")
+    args = parser.parse_args()
+
+    vehicle_class = GAMES[args.mode][1]
+    for spec in args.parameters:
+        name = spec.split("=")[0]
+        if name not in tunable(vehicle_class):
+            parser.error(
+                "{} is not a {} parameter, choose from {}".format(
+                    name, vehicle_class.__name__, ", ".join(tunable(vehicle_class))
+                )
+            )
+    if args.random:
+        configurations = random_search(args.parameters, args.random, args.seed)
+    else:
+        configurations = grid(args.parameters)
+    rng = random.Random(args.seed)
+    level_ids = [rng.getrandbits(32) for level in range(args.levels)]
+
+    rows = sweep(args.mode, configurations, level_ids, args.frames, args.workers)
+    columns = list(rows[0])
+    table = [columns] + [[str(row[column]) for column in columns] for row in rows]
+    widths = [max(len(line[i]) for line in table) for i in range(len(columns))]
+    for line in table:
+        print("  ".join(cell.rjust(width) for cell, width in zip(line, widths)))
+    if args.output:
+        with open(args.output, "w", newline="") as output_file:
+            writer = csv.DictWriter(output_file, columns)
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    main()